@@ -0,0 +1,24 @@
+"""profile model version
+
+Revision ID: 4b7d2c9a1f36
+Revises: e09c060309f1
+Create Date: 2026-10-18 17:05:12.418203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7d2c9a1f36'
+down_revision = 'e09c060309f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('profile', sa.Column('model_version', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('profile', 'model_version')
@@ -0,0 +1,24 @@
+"""profile notified at
+
+Revision ID: 7c1e5f2a9d48
+Revises: 4b7d2c9a1f36
+Create Date: 2026-10-18 19:42:37.106214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e5f2a9d48'
+down_revision = '4b7d2c9a1f36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('profile', sa.Column('notified_at', sa.TIMESTAMP(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('profile', 'notified_at')
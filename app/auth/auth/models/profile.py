@@ -35,6 +35,10 @@ class Profile(Base):
     hazard_score = Column(ARRAY(Float), nullable=True, unique=False)
     risk_score = Column(ARRAY(Float), nullable=True, unique=False)
     survival_score = Column(ARRAY(Float), nullable=True, unique=False)
+    # version of the model that produced the scores
+    model_version = Column(String, nullable=True, unique=False)
+    # when the scored profile message was confirmed by the broker, null until then
+    notified_at = Column(TIMESTAMP(timezone=True), nullable=True)
     created_at = Column(TIMESTAMP(timezone=True),
                         server_default=text("now()"), nullable=False)
     updated_at = Column(TIMESTAMP(timezone=True),
@@ -0,0 +1,258 @@
+import asyncio
+import json
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import aio_pika
+
+from consumer import crud, metrics, report, retry
+from consumer.client import ModelError, asyncModelClient
+from consumer.core.config import settings
+from consumer.db.session import SessionLocal
+from consumer.flow import AdaptiveLimit, CircuitBreaker, modelFailed
+from consumer.publisher import Publisher
+from consumer.retry import Retry
+from consumer.seen import SeenSet, messageKey
+
+
+def prepareBatch(bodies: List[bytes], version):
+    """
+    report.prepareBatch on a session of its own. The connection goes back to the pool
+    before the model is called, so no connection idles in a transaction meanwhile
+    """
+    with SessionLocal() as db:
+        return report.prepareBatch(bodies, db, crud, version)
+
+
+def storeBatch(messages, ids, prediction, times, current, notified):
+    with SessionLocal() as db:
+        return report.storeBatch(messages, ids, prediction, times, db, crud, current,
+                                 notified)
+
+
+def markNotified(messages):
+    with SessionLocal() as db:
+        report.markNotified(messages, db, crud)
+
+
+class Consumer:
+    """
+    Scores detail messages on an event loop. Database work runs on worker threads,
+    the reads and the writes of a batch each on a short session of their own, while
+    the model is called over a pooled async HTTP client so no thread is held during
+    inference (or, embedded, runs on a worker thread too)
+    """
+
+    def __init__(self, publisher: Publisher, model):
+        self.publisher = publisher
+        self.model = model
+        self.semaphore = asyncio.Semaphore(settings.CONSUMER_CONCURRENCY)
+        self.tasks = set()
+        self.limit = AdaptiveLimit(settings.MODEL_CONCURRENCY_INITIAL,
+                                   settings.MODEL_CONCURRENCY_MIN,
+                                   settings.MODEL_CONCURRENCY_MAX or settings.CONSUMER_CONCURRENCY,
+                                   settings.MODEL_LATENCY_TARGET_SECONDS,
+                                   settings.MODEL_CONCURRENCY_BACKOFF)
+        self.breaker = CircuitBreaker()
+        self.seen = SeenSet(settings.SEEN_MAX_SIZE)
+
+    async def score(self, bodies: List[bytes]) -> list:
+        """Returns a (message, error) pair for every message body, in order"""
+        loop = asyncio.get_running_loop()
+        try:
+            version = await self.model.version()
+        except ModelError:
+            version = None
+        messages, ids, model_data, current, notified = await loop.run_in_executor(
+            None, prepareBatch, bodies, version)
+        prediction = times = None
+        if ids:
+            await self.limit.acquire()
+            started = time.monotonic()
+            ok = False
+            try:
+                prediction = await self.model.predictBatch(model_data)
+                times = await self.model.times(prediction['model_version'])
+                ok = True
+            except ModelError as err:
+                ok = not modelFailed(err)
+                print(err.status_code, err.detail)
+                return [(None, err.detail) for _ in messages]
+            finally:
+                seconds = time.monotonic() - started
+                await self.limit.release(seconds, ok)
+                self.breaker.record(seconds, ok)
+        return await loop.run_in_executor(
+            None, storeBatch, messages, ids, prediction, times, current, notified)
+
+    async def finish(self, message: aio_pika.abc.AbstractIncomingMessage, scored, err) -> bool:
+        """
+        Publishes the scored message, returning True once the publish is confirmed. A
+        message whose profile message is already out is completed right away, one that
+        could not be scored or published is scheduled for a retry
+        """
+        if err:
+            print(f"Could not score message: {err}")
+            await self.retry(message, err)
+            return False
+        if scored is None:
+            await self.complete(message)
+            return False
+
+        try:
+            await self.publisher.publish(json.dumps(scored).encode())
+        except Exception as exc:
+            print("Error with publishing message on the RabbitMQ profile queue")
+            await self.retry(message, f"Publishing the profile message failed: {exc}")
+            return False
+        return True
+
+    async def complete(self, message: aio_pika.abc.AbstractIncomingMessage):
+        await message.ack()
+        self.seen.add(messageKey(message.body, message.message_id))
+
+    async def retry(self, message: aio_pika.abc.AbstractIncomingMessage, err):
+        """Moves the message to its delay queue or the dead letter queue"""
+        scheduled = Retry(message.headers, err)
+        try:
+            await self.publisher.publish(message.body, routing_key=scheduled.routing_key,
+                                         headers=scheduled.headers,
+                                         **retry.properties(message))
+        except Exception:
+            print(f"Could not schedule a retry on {scheduled.routing_key}")
+            await message.nack()
+            return
+        scheduled.record()
+        await message.ack()
+
+    async def handle(self, message: aio_pika.abc.AbstractIncomingMessage):
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            await self.handleBatch([message])
+        finally:
+            self.tasks.discard(task)
+
+    async def handleBatch(self, messages: List[aio_pika.abc.AbstractIncomingMessage]):
+        fresh = []
+        for message in messages:
+            if messageKey(message.body, message.message_id) in self.seen:
+                metrics.DUPLICATES.inc()
+                await message.ack()
+            else:
+                fresh.append(message)
+        if not fresh:
+            return
+        messages = fresh
+
+        async with self.semaphore:
+            try:
+                results = await self.score([message.body for message in messages])
+            except Exception as exc:
+                results = [(None, str(exc))] * len(messages)
+            published = await asyncio.gather(
+                *[self.finish(message, scored, err)
+                  for message, (scored, err) in zip(messages, results)])
+            # the detail messages are acked only once their profiles are marked notified
+            done = [(message, scored) for message, (scored, _), ok
+                    in zip(messages, results, published) if ok]
+            if done:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, markNotified, [scored for _, scored in done])
+                await asyncio.gather(*[self.complete(message) for message, _ in done])
+
+    async def collect(self, pending: asyncio.Queue):
+        """
+        Drains the delivered messages into batches of up to CONSUMER_BATCH_SIZE, closing
+        a batch CONSUMER_BATCH_WAIT_MS after its first message arrived
+        """
+        while True:
+            batch = [await pending.get()]
+            deadline = time.monotonic() + settings.CONSUMER_BATCH_WAIT_MS / 1000
+            while len(batch) < settings.CONSUMER_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(pending.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # wait for a free slot before draining the next batch so that batches fill up
+            # while every slot is busy
+            await self.semaphore.acquire()
+            self.semaphore.release()
+            task = asyncio.create_task(self.handleBatch(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def drain(self):
+        """Waits for the messages being scored"""
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+async def beat(heartbeat):
+    while True:
+        heartbeat()
+        await asyncio.sleep(settings.CONSUMER_HEARTBEAT_SECONDS)
+
+
+async def main(heartbeat=None):
+    """
+    Consumes the detail queue on an event loop. RabbitMQ delivers up to
+    CONSUMER_PREFETCH unacked messages and up to CONSUMER_CONCURRENCY of them (or
+    batches of them) are scored at the same time. On SIGTERM consumption stops and
+    the messages being scored are finished, undrained batches are redelivered
+    """
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(settings.CONSUMER_CONCURRENCY))
+    stop = asyncio.Event()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+
+    model = asyncModelClient()
+    connection = await aio_pika.connect_robust(host=settings.RABBITMQ_HOST)
+    async with connection:
+        channel = await connection.channel()
+        await channel.set_qos(prefetch_count=settings.CONSUMER_PREFETCH)
+        queue = await channel.get_queue(settings.DETAIL_QUEUE)
+        await retry.declareAsync(channel)
+        publisher = await Publisher.open(connection)
+        consumer = Consumer(publisher, model)
+        collector = None
+        if settings.CONSUMER_BATCH_SIZE > 1:
+            pending = asyncio.Queue()
+            collector = asyncio.create_task(consumer.collect(pending))
+            callback = pending.put
+        else:
+            callback = consumer.handle
+        consumer_tag = await queue.consume(callback)
+
+        async def pauseOnTrip():
+            """Stops consuming while the circuit is open, then resumes half open"""
+            nonlocal consumer_tag
+            while True:
+                await consumer.breaker.opened.wait()
+                await queue.cancel(consumer_tag)
+                consumer_tag = None
+                await asyncio.sleep(settings.BREAKER_OPEN_SECONDS)
+                consumer.limit.reset()
+                consumer.breaker.halfOpen()
+                consumer_tag = await queue.consume(callback)
+
+        guarding = asyncio.create_task(pauseOnTrip())
+        beating = asyncio.create_task(beat(heartbeat)) if heartbeat else None
+
+        print("Waiting for messages. To exit press CTRL+C")
+        try:
+            await stop.wait()
+            guarding.cancel()
+            if consumer_tag:
+                await queue.cancel(consumer_tag)
+            if collector:
+                collector.cancel()
+            await consumer.drain()
+        finally:
+            if beating:
+                beating.cancel()
+            await model.close()
@@ -0,0 +1,190 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from consumer.core.config import settings
+
+# Responses worth retrying: the model service is restarting, loading or overloaded
+RETRY_STATUS = {502, 503, 504}
+
+# times grid of each model version, served once per version by the model service
+model_times: Dict[str, List[float]] = {}
+
+# last model version the model service answered with and when
+served = {"version": None, "at": 0.}
+
+
+class ModelError(Exception):
+    def __init__(self, detail: Any, status_code: Optional[int] = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def baseUrl() -> str:
+    return f"http://{settings.MODEL_ADDRESS}:3200/v1/finlytik"
+
+
+def limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=settings.MODEL_POOL_SIZE,
+                        max_keepalive_connections=settings.MODEL_POOL_SIZE)
+
+
+def timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.MODEL_TIMEOUT_SECONDS,
+                         connect=settings.MODEL_CONNECT_TIMEOUT_SECONDS)
+
+
+def backoff(attempt: int) -> float:
+    return settings.MODEL_RETRY_BACKOFF_SECONDS * 2 ** attempt
+
+
+def checked(response: httpx.Response) -> Any:
+    if response.status_code != 200:
+        try:
+            detail = response.json()
+        except ValueError:
+            detail = response.text
+        raise ModelError(detail, response.status_code)
+    return response.json()
+
+
+def noteVersion(prediction: dict) -> dict:
+    served.update(version=prediction["model_version"], at=time.monotonic())
+    return prediction
+
+
+def knownVersion() -> Optional[str]:
+    if time.monotonic() - served["at"] < settings.MODEL_VERSION_SECONDS:
+        return served["version"]
+    return None
+
+
+def cacheTimes(metadata: dict, version: str) -> List[float]:
+    model_times[metadata["model_version"]] = metadata["times"]
+    if version not in model_times:
+        raise ModelError(f"Model {version} is no longer served")
+    return model_times[version]
+
+
+def notServed(err: ModelError, version: str) -> ModelError:
+    if err.status_code == 404:
+        return ModelError(f"Model {version} is no longer served", err.status_code)
+    return err
+
+
+class ModelClient:
+    """
+    Keep-alive connection pool to the model service, safe to share between threads.
+    Connection errors and 502/503/504 responses are retried with exponential backoff
+    up to MODEL_RETRIES times. Read timeouts are not: the model service is already
+    busy with the request and retrying would only add to its load
+    """
+
+    def __init__(self):
+        self.client = httpx.Client(base_url=baseUrl(), limits=limits(), timeout=timeout())
+
+    def request(self, method: str, url: str, **kwargs) -> Any:
+        for attempt in range(settings.MODEL_RETRIES + 1):
+            last = attempt == settings.MODEL_RETRIES
+            try:
+                response = self.client.request(method, url, **kwargs)
+            except httpx.ReadTimeout as err:
+                raise ModelError(f"Model service timed out: {err}")
+            except httpx.TransportError as err:
+                if last:
+                    raise ModelError(f"Model service unreachable: {err}")
+            else:
+                if response.status_code not in RETRY_STATUS or last:
+                    return checked(response)
+            time.sleep(backoff(attempt))
+
+    def predict(self, row: dict) -> dict:
+        return noteVersion(self.request("POST", "/predict", json=row))
+
+    def predictBatch(self, rows: List[dict]) -> dict:
+        return noteVersion(self.request("POST", "/predict/batch", json=rows))
+
+    def times(self, version: str) -> List[float]:
+        if version not in model_times:
+            try:
+                return cacheTimes(self.request("GET", f"/model/{version}"), version)
+            except ModelError as err:
+                raise notServed(err, version)
+        return model_times[version]
+
+    def version(self) -> str:
+        """Version being served, asked again at most every MODEL_VERSION_SECONDS"""
+        version = knownVersion()
+        if version is None:
+            metadata = noteVersion(self.request("GET", "/model"))
+            cacheTimes(metadata, metadata["model_version"])
+            version = metadata["model_version"]
+        return version
+
+    def close(self):
+        self.client.close()
+
+
+class AsyncModelClient:
+    """ModelClient for the event loop of the async consumer"""
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(base_url=baseUrl(), limits=limits(), timeout=timeout())
+
+    async def request(self, method: str, url: str, **kwargs) -> Any:
+        for attempt in range(settings.MODEL_RETRIES + 1):
+            last = attempt == settings.MODEL_RETRIES
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.ReadTimeout as err:
+                raise ModelError(f"Model service timed out: {err}")
+            except httpx.TransportError as err:
+                if last:
+                    raise ModelError(f"Model service unreachable: {err}")
+            else:
+                if response.status_code not in RETRY_STATUS or last:
+                    return checked(response)
+            await asyncio.sleep(backoff(attempt))
+
+    async def predict(self, row: dict) -> dict:
+        return noteVersion(await self.request("POST", "/predict", json=row))
+
+    async def predictBatch(self, rows: List[dict]) -> dict:
+        return noteVersion(await self.request("POST", "/predict/batch", json=rows))
+
+    async def times(self, version: str) -> List[float]:
+        if version not in model_times:
+            try:
+                return cacheTimes(await self.request("GET", f"/model/{version}"), version)
+            except ModelError as err:
+                raise notServed(err, version)
+        return model_times[version]
+
+    async def version(self) -> str:
+        version = knownVersion()
+        if version is None:
+            metadata = noteVersion(await self.request("GET", "/model"))
+            cacheTimes(metadata, metadata["model_version"])
+            version = metadata["model_version"]
+        return version
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def modelClient():
+    """The model of MODEL_MODE: the model service or its artifacts scored in process"""
+    if settings.MODEL_MODE == "embedded":
+        from consumer.embedded import EmbeddedModel
+        return EmbeddedModel()
+    return ModelClient()
+
+
+def asyncModelClient():
+    if settings.MODEL_MODE == "embedded":
+        from consumer.embedded import AsyncEmbeddedModel, EmbeddedModel
+        return AsyncEmbeddedModel(EmbeddedModel())
+    return AsyncModelClient()
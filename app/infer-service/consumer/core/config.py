@@ -1,4 +1,5 @@
-from typing import Any, Dict, Optional
+import os
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseSettings, PostgresDsn, validator
 
@@ -11,6 +12,8 @@ class Settings(BaseSettings):
     POSTGRES_DB: str
     POSTGRES_PORT: str
     SQLALCHEMY_DATABASE_URI: Optional[PostgresDsn] = None
+    # Connections the whole consumer fleet may hold, shared out between its workers
+    POSTGRES_CONNECTIONS: int = 64
 
     @validator("SQLALCHEMY_DATABASE_URI", pre=True)
     def assembleDbConnection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
@@ -24,9 +27,73 @@ class Settings(BaseSettings):
             path=f"/{values.get('POSTGRES_DB') or ''}",
         )
 
+    # "remote" calls the model service at MODEL_ADDRESS. "embedded" scores in process
+    # with the loader of the model service, imported from EMBEDDED_MODEL_DIR: the
+    # modelproduct directory mlflowmanager.downloadModel puts the artifacts in. That
+    # loader reads CURVE_DTYPE and CURVE_MAX_HORIZON like the service does. Serving the
+    # exported transform.npz and forest only needs numpy, the older data_pipe.sav and
+    # model.zip also need joblib, scikit-learn and pysurvival
+    MODEL_MODE: str = "remote"
+    EMBEDDED_MODEL_DIR: str = "../../training/modelproduct"
     MODEL_ADDRESS: str = "localhost"
+    # Keep-alive connections to the model service and the retries of failed calls
+    MODEL_POOL_SIZE: int = 32
+    MODEL_TIMEOUT_SECONDS: float = 10.0
+    MODEL_CONNECT_TIMEOUT_SECONDS: float = 2.0
+    MODEL_RETRIES: int = 2
+    MODEL_RETRY_BACKOFF_SECONDS: float = 0.2
+    # how long the served model version is trusted before it is asked again
+    MODEL_VERSION_SECONDS: float = 10.0
+
+    # Async mode: AIMD limit on the model calls in flight (MODEL_CONCURRENCY_MAX 0 means
+    # CONSUMER_CONCURRENCY), grown while calls answer within the latency target
+    MODEL_CONCURRENCY_INITIAL: int = 4
+    MODEL_CONCURRENCY_MIN: int = 1
+    MODEL_CONCURRENCY_MAX: int = 0
+    MODEL_CONCURRENCY_BACKOFF: float = 0.7
+    MODEL_LATENCY_TARGET_SECONDS: float = 1.0
+
+    # Async mode: consumption pauses for BREAKER_OPEN_SECONDS when the error or slow
+    # call rate over the last BREAKER_WINDOW model calls crosses its threshold
+    BREAKER_WINDOW: int = 50
+    BREAKER_MIN_CALLS: int = 10
+    BREAKER_ERROR_RATE: float = 0.5
+    BREAKER_SLOW_SECONDS: float = 5.0
+    BREAKER_SLOW_RATE: float = 0.5
+    BREAKER_OPEN_SECONDS: float = 30.0
     DETAIL_QUEUE: str = "detail"
     PROFILE_QUEUE: str = "profile"
+    RABBITMQ_HOST: str = "rabbitmq"
+    # profile messages that may wait for their publisher confirm at once
+    PUBLISH_WINDOW: int = 256
+
+    # Failed detail messages wait in TTL queues before they are redelivered and are
+    # moved to DEAD_LETTER_QUEUE once they have failed RETRY_MAX_ATTEMPTS times
+    RETRY_DELAYS_SECONDS: List[float] = [1.0, 5.0, 30.0, 120.0]
+    RETRY_MAX_ATTEMPTS: int = 5
+    DEAD_LETTER_QUEUE: str = "detail.dead"
+
+    # ids of the recently completed messages kept to drop redeliveries (0 disables)
+    SEEN_MAX_SIZE: int = 100000
+
+    # "blocking" handles one message at a time, "async" scores up to
+    # CONSUMER_CONCURRENCY of the CONSUMER_PREFETCH messages delivered at once
+    CONSUMER_MODE: str = "blocking"
+    CONSUMER_PREFETCH: int = 64
+    CONSUMER_CONCURRENCY: int = 32
+
+    # Async mode only: above 1, up to CONSUMER_BATCH_SIZE messages (or those that
+    # arrive within CONSUMER_BATCH_WAIT_MS) are scored together and acked together.
+    # CONSUMER_PREFETCH should be a few batches large
+    CONSUMER_BATCH_SIZE: int = 1
+    CONSUMER_BATCH_WAIT_MS: float = 50.0
+
+    # consumer.supervisor: worker processes, how often they report alive, how long
+    # they get to finish on shutdown and the port of the health and metrics endpoint
+    CONSUMER_WORKERS: int = os.cpu_count() or 1
+    CONSUMER_HEARTBEAT_SECONDS: float = 5.0
+    CONSUMER_SHUTDOWN_SECONDS: float = 30.0
+    HEALTH_PORT: int = 3220
 
     # class Config:
     #     case_sensitive = True
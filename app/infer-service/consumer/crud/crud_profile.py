@@ -1,16 +1,30 @@
 from typing import Any, Dict, Optional, Union, List
 
+from sqlalchemy import Row, func, select, update
 from sqlalchemy.orm import Session
 
 from consumer.crud.base import CRUDBase
 from consumer.models.profile import Profile
-from consumer.schemas.profile import ProfileUpdate
+from consumer.schemas.profile import ProfileModel, ProfileUpdate
+
+# Columns of a profile the model is fed, in the order of the model request
+MODEL_FIELDS = tuple(ProfileModel.__fields__)
 
 
 class CRUDProfile(CRUDBase[Profile, ProfileUpdate]):
     def getByID(self, db: Session, *, id: str) -> Optional[Profile]:
         return db.query(Profile).filter(Profile.id == id).first()
 
+    def getFeatures(self, db: Session, *, ids: List[str]) -> List[Row]:
+        """
+        (id, model_version, notified_at, *MODEL_FIELDS) tuples of the profiles, without
+        loading ORM objects
+        """
+        columns = [getattr(Profile, field) for field in MODEL_FIELDS]
+        return db.execute(select(Profile.id, Profile.model_version, Profile.notified_at,
+                                 *columns)
+                          .where(Profile.id.in_(ids))).all()
+
     def getByEmail(self, db: Session, *, email: str) -> Optional[Profile]:
         return db.query(Profile).filter(Profile.email == email).first()
 
@@ -27,6 +41,25 @@ class CRUDProfile(CRUDBase[Profile, ProfileUpdate]):
             update_data = obj_in.dict(exclude_unset=True)
         return super().update(db, db_obj=db_obj, obj_in=update_data)
 
+    def updateScores(self, db: Session, *, scores: List[Dict[str, Any]]) -> None:
+        """
+        Writes the times, scores and model_version of many profiles
+        (dicts keyed by the profile id) as one executemany UPDATE in one transaction.
+        Nothing is loaded or refreshed
+        """
+        if not scores:
+            return
+        db.execute(update(Profile), scores)
+        db.commit()
+
+    def markNotified(self, db: Session, *, ids: List[str]) -> None:
+        """Records that the profile messages of the profiles were published"""
+        if not ids:
+            return
+        db.execute(update(Profile).where(Profile.id.in_(ids))
+                   .values(notified_at=func.now()))
+        db.commit()
+
     def delete(self, db: Session, *, id: str) -> None:
         db_obj = db.query(Profile).filter(Profile.id == id).first()
         db.delete(db_obj)
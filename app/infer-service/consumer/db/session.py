@@ -3,5 +3,20 @@ from sqlalchemy.orm import sessionmaker
 
 from consumer.core.config import settings
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+
+def poolSize() -> int:
+    """
+    Connections of one consumer worker: its share of POSTGRES_CONNECTIONS, and no more
+    than the batches it works on at once (one in blocking mode)
+    """
+    concurrency = settings.CONSUMER_CONCURRENCY if settings.CONSUMER_MODE == "async" else 1
+    share = settings.POSTGRES_CONNECTIONS // max(1, settings.CONSUMER_WORKERS)
+    return max(1, min(concurrency, share))
+
+
+# values_plus_batch sends executemany UPDATEs in pages (psycopg2 execute_batch)
+# instead of one round trip per row
+engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True,
+                       pool_size=poolSize(), max_overflow=0,
+                       executemany_mode="values_plus_batch")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
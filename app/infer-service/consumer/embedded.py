@@ -0,0 +1,81 @@
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List
+
+from consumer.client import ModelError
+from consumer.core.config import settings
+
+
+def loadClassifier(model_dir: str):
+    """
+    Imports the classifier of the model service from model_dir, the modelproduct
+    directory that holds both its code and the artifacts downloadModel fetches
+    """
+    path = str(Path(model_dir).resolve())
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    import classifier
+    return classifier
+
+
+class EmbeddedModel:
+    """
+    Scores in process with the loader of the model service, so the model version, the
+    compiled forest and transform and the CURVE_* reductions are the ones the service
+    serves from the same artifacts. Answers like ModelClient
+    """
+
+    def __init__(self, model_dir: str = None):
+        model_dir = model_dir or settings.EMBEDDED_MODEL_DIR
+        self.loaded = loadClassifier(model_dir).loadArtifacts(model_dir)
+        print(f"Serving model version {self.loaded.version} in process")
+
+    def predictBatch(self, rows: List[dict]) -> dict:
+        prediction = self.loaded.predictRows([SimpleNamespace(**row) for row in rows])
+        return {"model_version": prediction.version,
+                "hazard": prediction.hazard.tolist(),
+                "risk": prediction.risk.ravel().tolist(),
+                "survival": prediction.survival.tolist()}
+
+    def predict(self, row: dict) -> dict:
+        prediction = self.predictBatch([row])
+        return {"model_version": prediction["model_version"],
+                "hazard": prediction["hazard"][0],
+                "risk": prediction["risk"],
+                "survival": prediction["survival"][0]}
+
+    def times(self, version: str) -> List[float]:
+        if version != self.loaded.version:
+            raise ModelError(f"Model {version} is no longer served", 404)
+        return self.loaded.times
+
+    def version(self) -> str:
+        return self.loaded.version
+
+    def close(self):
+        pass
+
+
+class AsyncEmbeddedModel:
+    """EmbeddedModel for the async consumer, predictions run on worker threads"""
+
+    def __init__(self, model: EmbeddedModel):
+        self.model = model
+
+    async def predictBatch(self, rows: List[dict]) -> dict:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.model.predictBatch, rows)
+
+    async def predict(self, row: dict) -> dict:
+        return await asyncio.get_running_loop().run_in_executor(None, self.model.predict, row)
+
+    async def times(self, version: str) -> List[float]:
+        return self.model.times(version)
+
+    async def version(self) -> str:
+        return self.model.version()
+
+    async def close(self):
+        pass
@@ -0,0 +1,101 @@
+import asyncio
+from collections import deque
+
+from consumer import metrics
+from consumer.core.config import settings
+
+
+class AdaptiveLimit:
+    """
+    AIMD limit on the model calls in flight. Every call answered within
+    MODEL_LATENCY_TARGET_SECONDS grows the limit by 1/limit (about one per round of
+    calls), a slow or failed call cuts it by MODEL_CONCURRENCY_BACKOFF, so the
+    consumer settles just under the load where the model service starts queueing
+    """
+
+    def __init__(self, initial: float, minimum: int, maximum: int, target: float,
+                 backoff: float):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target = target
+        self.backoff = backoff
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.inflight = 0
+        self.condition = asyncio.Condition()
+        metrics.MODEL_CONCURRENCY.set(self.limit)
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+
+    async def release(self, seconds: float, ok: bool):
+        async with self.condition:
+            self.inflight -= 1
+            if ok and seconds <= self.target:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            else:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+            metrics.MODEL_CONCURRENCY.set(self.limit)
+            self.condition.notify_all()
+
+    def reset(self):
+        self.limit = float(self.minimum)
+        metrics.MODEL_CONCURRENCY.set(self.limit)
+
+
+class CircuitBreaker:
+    """
+    Opens when, over the last BREAKER_WINDOW model calls, the share of failed calls
+    reaches BREAKER_ERROR_RATE or the share of calls slower than BREAKER_SLOW_SECONDS
+    reaches BREAKER_SLOW_RATE. While open the consumer stops consuming; after
+    BREAKER_OPEN_SECONDS it is half open and consumes again, closing after
+    BREAKER_MIN_CALLS good calls or opening again on the first bad one
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.calls = deque(maxlen=settings.BREAKER_WINDOW)
+        self.opened = asyncio.Event()
+        metrics.BREAKER_OPEN.set(0)
+
+    def record(self, seconds: float, ok: bool):
+        slow = seconds > settings.BREAKER_SLOW_SECONDS
+        if self.state == self.OPEN:
+            return
+        if self.state == self.HALF_OPEN:
+            if not ok or slow:
+                self.trip()
+                return
+            self.calls.append((ok, slow))
+            if len(self.calls) >= settings.BREAKER_MIN_CALLS:
+                self.state = self.CLOSED
+                print("Model circuit closed")
+            return
+
+        self.calls.append((ok, slow))
+        if len(self.calls) < settings.BREAKER_MIN_CALLS:
+            return
+        errors = sum(not ok for ok, _ in self.calls) / len(self.calls)
+        slows = sum(slow for _, slow in self.calls) / len(self.calls)
+        if errors >= settings.BREAKER_ERROR_RATE or slows >= settings.BREAKER_SLOW_RATE:
+            self.trip()
+
+    def trip(self):
+        print(f"Model circuit open, pausing consumption for {settings.BREAKER_OPEN_SECONDS}s")
+        self.state = self.OPEN
+        self.calls.clear()
+        self.opened.set()
+        metrics.BREAKER_OPEN.set(1)
+
+    def halfOpen(self):
+        self.state = self.HALF_OPEN
+        self.opened.clear()
+        metrics.BREAKER_OPEN.set(0)
+
+
+def modelFailed(err) -> bool:
+    """Failures that say something about the model service, not about the request"""
+    return err.status_code is None or err.status_code >= 500
@@ -1,37 +1,97 @@
+import asyncio
 import pika
+import signal
 import sys
 import os
 from sqlalchemy.orm import Session
-from consumer import deps, crud
-from consumer import report
+from consumer import crud
+from consumer import aioconsumer, metrics, report, retry
 from consumer.core.config import settings
+from consumer.db.session import SessionLocal
+from consumer.retry import Retry
+from consumer.seen import SeenSet, messageKey
+from prometheus_client import start_http_server
 
 
-def main(db: Session = next(deps.getDb())):
+def main(db: Session, heartbeat=None):
     # rabbitmq connection
     connection = pika.BlockingConnection(
-        pika.ConnectionParameters(host="rabbitmq"))
+        pika.ConnectionParameters(host=settings.RABBITMQ_HOST))
     channel = connection.channel()
+    # basic_publish waits for the broker confirm, so a detail message is only acked
+    # once its profile message is safe
+    channel.confirm_delivery()
+    retry.declare(channel)
+
+    seen = SeenSet(settings.SEEN_MAX_SIZE)
 
     def callback(ch, method, properties, body):
-        err = report.start(body, db, crud, ch)
+        key = messageKey(body, properties.message_id)
+        if key in seen:
+            metrics.DUPLICATES.inc()
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+
+        try:
+            err = report.start(body, db, crud, ch)
+        except Exception as exc:
+            # A malformed body or a database error must not stop the worker: the
+            # message would be redelivered to it again right after its restart
+            db.rollback()
+            print(f"Could not score message: {exc}")
+            err = str(exc)
         if err:
-            ch.basic_nack(delivery_tag=method.delivery_tag)
+            # move the message to its delay queue or the dead letter queue
+            scheduled = Retry(properties.headers, err)
+            try:
+                ch.basic_publish(
+                    exchange="",
+                    routing_key=scheduled.routing_key,
+                    body=body,
+                    properties=pika.BasicProperties(
+                        headers=scheduled.headers,
+                        delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
+                        **retry.properties(properties)),
+                    mandatory=True,
+                )
+            except Exception:
+                ch.basic_nack(delivery_tag=method.delivery_tag)
+                return
+            scheduled.record()
         else:
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            seen.add(key)
+        ch.basic_ack(delivery_tag=method.delivery_tag)
 
     channel.basic_consume(
         queue=settings.DETAIL_QUEUE, on_message_callback=callback
     )
 
+    # finish the message in hand, then stop
+    def stop(signum, frame):
+        connection.add_callback_threadsafe(channel.stop_consuming)
+
+    signal.signal(signal.SIGTERM, stop)
+
+    if heartbeat:
+        def beat():
+            heartbeat()
+            connection.call_later(settings.CONSUMER_HEARTBEAT_SECONDS, beat)
+        beat()
+
     print("Waiting for messages. To exit press CTRL+C")
 
     channel.start_consuming()
+    connection.close()
 
 
 if __name__ == "__main__":
     try:
-        main()
+        start_http_server(settings.HEALTH_PORT)
+        if settings.CONSUMER_MODE == "async":
+            asyncio.run(aioconsumer.main())
+        else:
+            with SessionLocal() as db:
+                main(db)
     except KeyboardInterrupt:
         print("Interrupted")
         try:
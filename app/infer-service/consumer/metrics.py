@@ -0,0 +1,30 @@
+import os
+
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, REGISTRY,
+                               generate_latest)
+from prometheus_client import multiprocess
+
+# Under consumer.supervisor every worker process writes its samples to
+# PROMETHEUS_MULTIPROC_DIR and the supervisor aggregates them on /metrics
+RETRIES = Counter('finlytik_consumer_retries_total', 'Detail messages scheduled for a retry',
+                  ['delay'])
+DEAD_LETTERS = Counter('finlytik_consumer_dead_letters_total',
+                       'Detail messages dead lettered after their last attempt')
+DUPLICATES = Counter('finlytik_consumer_duplicates_total',
+                     'Redelivered detail messages acked without any work')
+ALREADY_SCORED = Counter('finlytik_consumer_already_scored_total',
+                         'Profiles not sent to the model, already scored by the served version')
+MODEL_CONCURRENCY = Gauge('finlytik_consumer_model_concurrency_limit',
+                          'Adaptive limit on the model calls in flight', multiprocess_mode='liveall')
+BREAKER_OPEN = Gauge('finlytik_consumer_breaker_open',
+                     'Whether the model circuit breaker has paused consumption',
+                     multiprocess_mode='liveall')
+
+
+def render():
+    """Returns the content type and body of the metrics of every consumer process"""
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return CONTENT_TYPE_LATEST, generate_latest(registry)
@@ -0,0 +1,39 @@
+import asyncio
+
+import aio_pika
+
+from consumer.core.config import settings
+
+
+class Publisher:
+    """
+    Publishes scored messages on a channel of its own with publisher confirms.
+
+    Publishes are pipelined: up to PUBLISH_WINDOW messages can be waiting for their
+    confirm at once and further publishes wait for a free slot. publish only returns
+    once the broker has confirmed the message (and raises if it was nacked or could
+    not be routed), so the detail message is acked only after its profile message
+    is safe
+    """
+
+    def __init__(self, channel: aio_pika.abc.AbstractChannel, routing_key: str, window: int):
+        self.channel = channel
+        self.routing_key = routing_key
+        self.window = asyncio.Semaphore(window)
+
+    @classmethod
+    async def open(cls, connection: aio_pika.abc.AbstractConnection) -> "Publisher":
+        channel = await connection.channel(publisher_confirms=True, on_return_raises=True)
+        return cls(channel, settings.PROFILE_QUEUE, settings.PUBLISH_WINDOW)
+
+    async def publish(self, body: bytes, routing_key: str = None, headers: dict = None,
+                      **properties) -> None:
+        async with self.window:
+            await self.channel.default_exchange.publish(
+                aio_pika.Message(body=body, headers=headers,
+                                 delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                                 **properties),
+                routing_key=routing_key or self.routing_key, mandatory=True)
+
+    async def close(self):
+        await self.channel.close()
@@ -1,66 +1,126 @@
 import pika
 import json
-import os
-from consumer import schemas
-import requests
-from fastapi.encoders import jsonable_encoder
-from fastapi import HTTPException
+from consumer import metrics
+from consumer.client import ModelError, modelClient
 from consumer.core.config import settings
+from consumer.crud.crud_profile import MODEL_FIELDS
 
+model = None
 
-def start(message, db, crud, channel):
-    message = json.loads(message)
-
-    # fetch from db profile contents
-    # TODO: clear type conversions here from db profile to Details pydantic model
-    current_profile = crud.profile.getByID(db, id=message["profile_id"])
-    current_profile_data = jsonable_encoder(current_profile)
-    model_data = schemas.ProfileModel(
-        age=current_profile_data['age'],
-        email=current_profile_data['email'],
-        annual_income=current_profile_data['annual_income'],
-        monthly_inhand_salary=current_profile_data['monthly_inhand_salary'],
-        num_bank_accounts=current_profile_data['num_bank_accounts'],
-        num_credit_card=current_profile_data['num_credit_card'],
-        interest_rate=current_profile_data['interest_rate'],
-        num_of_loan=current_profile_data['num_of_loan'],
-        num_of_delayed_payment=current_profile_data['num_of_delayed_payment'],
-        changed_credit_limit=current_profile_data['changed_credit_limit'],
-        num_credit_inquiries=current_profile_data['num_credit_inquiries'],
-        credit_mix=current_profile_data['credit_mix'],
-        outstanding_debt=current_profile_data['outstanding_debt'],
-        credit_utilization_ratio=current_profile_data['credit_utilization_ratio'],
-        credit_history_age=current_profile_data['credit_history_age'],
-        payment_of_min_amount=current_profile_data['payment_of_min_amount'],
-        total_emi_per_month=current_profile_data['total_emi_per_month'],
-        amount_invested_monthly=current_profile_data['amount_invested_monthly'],
-        payment_behaviour=current_profile_data['payment_behaviour'],
-        monthly_balance=current_profile_data['monthly_balance'],
-    )
-    profile_in = schemas.ProfileUpdate(**current_profile_data)
-
-    # Infer
-    response = requests.post(
-        f"http://{settings.MODEL_ADDRESS}:3200/v1/finlytik/predict", json=model_data.dict())
-
-    if response.status_code == 200:
-        profile_in.times = response.json()['times']
-        profile_in.hazard_score = response.json()['hazard']
-        profile_in.risk_score = response.json()['risk']
-        profile_in.survival_score = response.json()['survival']
-        crud.profile.update(db, db_obj=current_profile, obj_in=profile_in)
-        message["processed"] = True
 
+def getModel():
+    global model
+    if model is None:
+        model = modelClient()
+    return model
+
+
+def score(message, db, crud):
+    """
+    Scores the profile referenced by a detail message and stores the result.
+    Returns the message to publish on the profile queue, or None and the error.
+    None and no error means the profile message was already published
+    """
+    return scoreBatch([message], db, crud)[0]
+
+
+def prepareBatch(messages, db, crud, version=None):
+    """
+    Parses a batch of detail messages and selects the model columns of their
+    profiles with one query. Redelivered messages are not scored again: profiles
+    whose message was already published are done, those already scored by the
+    served model version only need publishing. Returns the messages, the ids of the
+    profiles to score, their model request rows, the ids already scored and the ids
+    already notified
+    """
+    messages = [json.loads(message) for message in messages]
+    rows = crud.profile.getFeatures(db, ids=[message["profile_id"] for message in messages])
+    notified = {str(row[0]) for row in rows if row[2] is not None}
+    current = {str(row[0]) for row in rows
+               if version is not None and row[1] == version and str(row[0]) not in notified}
+    rows = [row for row in rows if str(row[0]) not in notified | current]
+    metrics.DUPLICATES.inc(len(notified))
+    metrics.ALREADY_SCORED.inc(len(current))
+    return (messages, [row[0] for row in rows],
+            [dict(zip(MODEL_FIELDS, row[3:])) for row in rows], current, notified)
+
+
+def storeBatch(messages, ids, prediction, times, db, crud, current=(), notified=()):
+    """
+    Stores the batch prediction of the profiles in one commit. Returns a (message,
+    error) pair for every message, in order, (None, None) for those already notified
+    """
+    crud.profile.updateScores(db, scores=[{"id": id,
+                                           "times": times,
+                                           "hazard_score": prediction['hazard'][i],
+                                           "risk_score": [prediction['risk'][i]],
+                                           "survival_score": prediction['survival'][i],
+                                           "model_version": prediction['model_version']}
+                                          for i, id in enumerate(ids)])
+
+    scored = {str(id) for id in ids} | set(current)
+    results = []
+    for message in messages:
+        if str(message["profile_id"]) in notified:
+            results.append((None, None))
+        elif str(message["profile_id"]) in scored:
+            message["processed"] = True
+            results.append((message, None))
+        else:
+            results.append((None, f"Profile {message['profile_id']} not found"))
+    return results
+
+
+def scoreBatch(messages, db, crud):
+    """
+    Scores the profiles of many detail messages with one query, one model call and
+    one commit. Returns a (message, error) pair for every message, in order
+    """
+    try:
+        version = getModel().version()
+    except ModelError:
+        version = None
+    messages, ids, model_data, current, notified = prepareBatch(messages, db, crud, version)
+    prediction = times = None
+    if ids:
         try:
-            channel.basic_publish(
-                exchange="",
-                routing_key=settings.PROFILE_QUEUE,
-                body=json.dumps(message),
-                properties=pika.BasicProperties(
-                    delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE),
-            )
-        except Exception as err:
-            return "Error with publishing message on the RabbitMQ profile queue"
-    else:
-        print(response.status_code, response.json())
-        return response.json()
+            prediction = getModel().predictBatch(model_data)
+            times = getModel().times(prediction['model_version'])
+        except ModelError as err:
+            print(err.status_code, err.detail)
+            return [(None, err.detail) for _ in messages]
+    return storeBatch(messages, ids, prediction, times, db, crud, current, notified)
+
+
+def markNotified(messages, db, crud):
+    """
+    Records that the profile messages were published, so a redelivery of their
+    detail messages is acked without publishing again. The messages are out
+    already, a failure here is only logged
+    """
+    try:
+        crud.profile.markNotified(db, ids=[message["profile_id"] for message in messages])
+    except Exception as err:
+        db.rollback()
+        print(f"Could not mark profiles as notified: {err}")
+
+
+def start(message, db, crud, channel):
+    message, err = score(message, db, crud)
+    if err:
+        return err
+    if message is None:
+        return None
+
+    try:
+        channel.basic_publish(
+            exchange="",
+            routing_key=settings.PROFILE_QUEUE,
+            body=json.dumps(message),
+            properties=pika.BasicProperties(
+                delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE),
+            mandatory=True,
+        )
+    except Exception as err:
+        return "Error with publishing message on the RabbitMQ profile queue"
+    markNotified([message], db, crud)
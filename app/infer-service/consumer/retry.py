@@ -0,0 +1,74 @@
+from typing import Optional
+
+from consumer import metrics
+from consumer.core.config import settings
+
+ATTEMPTS_HEADER = "x-attempts"
+ERROR_HEADER = "x-last-error"
+
+# Properties a retried message keeps besides its headers. expiration is left to the
+# delay queue TTL and user_id would have to match the republishing connection
+PROPERTIES = ("content_type", "content_encoding", "priority", "correlation_id",
+              "reply_to", "message_id", "timestamp", "type", "app_id")
+
+
+def delayQueue(delay: float) -> str:
+    return f"{settings.DETAIL_QUEUE}.retry.{int(delay * 1000)}ms"
+
+
+def delayQueueArguments(delay: float) -> dict:
+    """Messages expire from a delay queue after delay and dead letter back onto DETAIL_QUEUE"""
+    return {"x-message-ttl": int(delay * 1000),
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": settings.DETAIL_QUEUE}
+
+
+def queues() -> dict:
+    """Name and arguments of the delay queues and the dead letter queue"""
+    declared = {delayQueue(delay): delayQueueArguments(delay)
+                for delay in settings.RETRY_DELAYS_SECONDS}
+    declared[settings.DEAD_LETTER_QUEUE] = {}
+    return declared
+
+
+class Retry:
+    """
+    Where a failed detail message goes next. Attempt n waits RETRY_DELAYS_SECONDS[n - 1]
+    (the last delay once they run out) in a TTL queue before it is redelivered, and the
+    message is dead lettered once it has failed RETRY_MAX_ATTEMPTS times
+    """
+
+    def __init__(self, headers: Optional[dict], err):
+        headers = dict(headers or {})
+        self.attempts = int(headers.get(ATTEMPTS_HEADER, 0)) + 1
+        self.headers = {**headers, ATTEMPTS_HEADER: self.attempts, ERROR_HEADER: str(err)[:512]}
+        self.dead = self.attempts >= settings.RETRY_MAX_ATTEMPTS
+        if self.dead:
+            self.routing_key = settings.DEAD_LETTER_QUEUE
+        else:
+            delays = settings.RETRY_DELAYS_SECONDS
+            self.delay = delays[min(self.attempts, len(delays)) - 1]
+            self.routing_key = delayQueue(self.delay)
+
+    def record(self):
+        """Counts the message once it has been republished"""
+        if self.dead:
+            metrics.DEAD_LETTERS.inc()
+        else:
+            metrics.RETRIES.labels(delay=f"{self.delay:g}").inc()
+
+
+def properties(message) -> dict:
+    """The PROPERTIES set on an aio-pika message or pika BasicProperties"""
+    return {name: getattr(message, name) for name in PROPERTIES
+            if getattr(message, name, None) is not None}
+
+
+async def declareAsync(channel):
+    for name, arguments in queues().items():
+        await channel.declare_queue(name, durable=True, arguments=arguments or None)
+
+
+def declare(channel):
+    for name, arguments in queues().items():
+        channel.queue_declare(queue=name, durable=True, arguments=arguments or None)
@@ -0,0 +1,32 @@
+import json
+from collections import OrderedDict
+from typing import Optional
+
+
+def messageKey(body: bytes, message_id: Optional[str] = None) -> Optional[str]:
+    """The message id, or the profile id of the detail message when it has none"""
+    if message_id:
+        return message_id
+    try:
+        return str(json.loads(body)["profile_id"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class SeenSet:
+    """Keys of the messages completed most recently, the oldest dropped beyond max_size"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.keys = OrderedDict()
+
+    def __contains__(self, key) -> bool:
+        return key is not None and key in self.keys
+
+    def add(self, key):
+        if key is None or self.max_size <= 0:
+            return
+        self.keys[key] = None
+        self.keys.move_to_end(key)
+        while len(self.keys) > self.max_size:
+            self.keys.popitem(last=False)
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from consumer.core.config import settings
+
+
+def runWorker(index: int, heartbeats):
+    """
+    Entry point of a worker process. The database engine and the RabbitMQ connection
+    are only created in here, so every worker has its own connection pool and channel
+    """
+    # The forked worker starts with the supervisor's handlers: SIGTERM stops it until
+    # the consumer installs its own, Ctrl+C reaches the whole process group and the
+    # supervisor stops the workers itself
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # main and aioconsumer.main only beat once they consume, a worker failing to
+    # connect never looks healthy
+    def heartbeat():
+        heartbeats[index] = time.time()
+
+    if settings.CONSUMER_MODE == "async":
+        from consumer import aioconsumer
+        asyncio.run(aioconsumer.main(heartbeat=heartbeat))
+    else:
+        from consumer.db.session import SessionLocal
+        from consumer.main import main
+        with SessionLocal() as db:
+            main(db, heartbeat=heartbeat)
+
+
+class Supervisor:
+    """
+    Forks CONSUMER_WORKERS consumer processes, restarts the ones that exit and
+    reports the health of each worker from the heartbeats they write to shared memory.
+    The supervisor itself is alive as long as its restart loop keeps turning
+    """
+
+    def __init__(self, workers: int):
+        # must be set before prometheus_client is imported by the workers
+        os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR",
+                              tempfile.mkdtemp(prefix="consumer-metrics-"))
+        self.context = multiprocessing.get_context("fork")
+        self.heartbeats = self.context.Array("d", workers, lock=False)
+        self.processes = [None] * workers
+        self.started = [0.] * workers
+        self.restarts = [0] * workers
+        self.stopping = threading.Event()
+        self.looped = time.monotonic()
+
+    def spawn(self, index: int):
+        process = self.context.Process(target=runWorker, args=(index, self.heartbeats),
+                                       name=f"consumer-{index}")
+        # the last beat of the worker it replaces must not count for the new one
+        self.heartbeats[index] = 0.
+        process.start()
+        self.processes[index] = process
+        self.started[index] = time.monotonic()
+
+    def health(self):
+        """
+        A worker is healthy while it beats. One restarted within the last few beats is
+        not, so a worker that keeps crashing soon after it starts consuming never
+        reports ready
+        """
+        now = time.time()
+        window = 3 * settings.CONSUMER_HEARTBEAT_SECONDS
+        workers = []
+        for index, process in enumerate(self.processes):
+            age = now - self.heartbeats[index]
+            alive = process is not None and process.is_alive()
+            restarting = self.restarts[index] and \
+                time.monotonic() - self.started[index] < window
+            workers.append({"worker": index,
+                            "pid": process.pid if process else None,
+                            "alive": alive,
+                            "healthy": bool(alive and age < window and not restarting),
+                            "heartbeat_age": round(age, 3),
+                            "restarts": self.restarts[index]})
+        return all(worker["healthy"] for worker in workers), workers
+
+    def alive(self) -> bool:
+        return time.monotonic() - self.looped < 3 * settings.CONSUMER_HEARTBEAT_SECONDS
+
+    def stop(self, signum=None, frame=None):
+        self.stopping.set()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(len(self.processes)):
+            self.spawn(index)
+        server = serveHealth(self)
+        print(f"Supervising {len(self.processes)} consumer workers")
+
+        while not self.stopping.wait(1.):
+            self.looped = time.monotonic()
+            for index, process in enumerate(self.processes):
+                # a worker failing at start (e.g. RabbitMQ down) is not restarted in a hot loop
+                if process.is_alive() or \
+                        time.monotonic() - self.started[index] < settings.CONSUMER_HEARTBEAT_SECONDS:
+                    continue
+                print(f"Consumer worker {index} exited with {process.exitcode}, restarting")
+                markDead(process.pid)
+                self.restarts[index] += 1
+                self.spawn(index)
+
+        self.shutdown()
+        server.shutdown()
+
+    def shutdown(self):
+        """Asks every worker to finish its messages, killing those that do not in time"""
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + settings.CONSUMER_SHUTDOWN_SECONDS
+        for process in self.processes:
+            process.join(max(0., deadline - time.monotonic()))
+            if process.is_alive():
+                print(f"Consumer worker {process.name} did not stop in time, killing it")
+                process.kill()
+                process.join()
+
+
+def markDead(pid: int):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(pid)
+
+
+def serveHealth(supervisor: Supervisor) -> ThreadingHTTPServer:
+    """
+    Serves on HEALTH_PORT:
+    - /metrics, the metrics of all the workers
+    - /health/live, 503 once the supervisor loop is stuck. A stuck worker is not a
+      reason to restart the container, the supervisor restarts workers that exit
+    - /health/ready and /health, the state of every worker, 503 if none is healthy
+    """
+
+    class HealthHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                from consumer import metrics
+                content_type, body = metrics.render()
+                status = 200
+            elif self.path == "/health/live":
+                alive = supervisor.alive()
+                content_type = "application/json"
+                body = json.dumps({"alive": alive}).encode()
+                status = 200 if alive else 503
+            else:
+                healthy, workers = supervisor.health()
+                ready = any(worker["healthy"] for worker in workers)
+                content_type = "application/json"
+                body = json.dumps({"healthy": healthy, "ready": ready,
+                                   "workers": workers}).encode()
+                status = 200 if ready else 503
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("", settings.HEALTH_PORT), HealthHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    Supervisor(settings.CONSUMER_WORKERS).run()
@@ -0,0 +1,7 @@
+import os
+
+# The unit tests never connect to Postgres, the settings only need to be complete
+for name, value in {"POSTGRES_HOST": "localhost", "POSTGRES_PORT": "5432",
+                    "POSTGRES_USER": "finlytik", "POSTGRES_PASSWORD": "finlytik",
+                    "POSTGRES_DB": "finlytik"}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,127 @@
+import asyncio
+
+import httpx
+import pytest
+
+from consumer import client
+from consumer.client import AsyncModelClient, ModelClient, ModelError, baseUrl
+from consumer.core.config import settings
+
+PREDICTION = {"model_version": "v1", "hazard": [[.1]], "risk": [1.], "survival": [[.9]]}
+
+
+class Service:
+    """Answers the model service calls in turn from responses or transport errors"""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append(request.url.path)
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def response(status_code: int, json=None) -> httpx.Response:
+    return httpx.Response(status_code, json=json if json is not None else {"detail": "x"})
+
+
+@pytest.fixture(autouse=True)
+def noBackoff(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "MODEL_RETRIES", 2)
+    monkeypatch.setattr(settings, "MODEL_RETRY_BACKOFF_SECONDS", 0.)
+    monkeypatch.setattr(client, "model_times", {})
+    monkeypatch.setattr(client, "served", {"version": None, "at": 0.})
+
+
+@pytest.fixture(params=["blocking", "async"])
+def call(request):
+    """Calls a method of the blocking or the async client talking to a Service"""
+    def blocking(service: Service, method: str, *args):
+        model = ModelClient()
+        model.client.close()
+        model.client = httpx.Client(base_url=baseUrl(), transport=httpx.MockTransport(service))
+        try:
+            return getattr(model, method)(*args)
+        finally:
+            model.close()
+
+    def asynchronous(service: Service, method: str, *args):
+        async def run():
+            model = AsyncModelClient()
+            await model.client.aclose()
+            model.client = httpx.AsyncClient(base_url=baseUrl(),
+                                             transport=httpx.MockTransport(service))
+            try:
+                return await getattr(model, method)(*args)
+            finally:
+                await model.close()
+        return asyncio.run(run())
+
+    return blocking if request.param == "blocking" else asynchronous
+
+
+@pytest.mark.parametrize("status_code", [502, 503, 504])
+def testUnavailableServiceIsRetried(call, status_code: int) -> None:
+    service = Service(response(status_code), response(200, PREDICTION))
+    assert call(service, "predictBatch", [{}]) == PREDICTION
+    assert service.calls == ["/v1/finlytik/predict/batch"] * 2
+
+
+def testTransportErrorIsRetried(call) -> None:
+    service = Service(httpx.ConnectError("refused"), response(200, PREDICTION))
+    assert call(service, "predictBatch", [{}]) == PREDICTION
+    assert len(service.calls) == 2
+
+
+def testRetriesStopAtModelRetries(call) -> None:
+    service = Service(*[response(503)] * 3)
+    with pytest.raises(ModelError) as err:
+        call(service, "predictBatch", [{}])
+    assert err.value.status_code == 503
+    assert len(service.calls) == settings.MODEL_RETRIES + 1
+
+
+def testUnreachableServiceAfterRetries(call) -> None:
+    service = Service(*[httpx.ConnectError("refused")] * 3)
+    with pytest.raises(ModelError, match="unreachable"):
+        call(service, "predictBatch", [{}])
+    assert len(service.calls) == 3
+
+
+def testReadTimeoutIsNotRetried(call) -> None:
+    service = Service(httpx.ReadTimeout("slow"), response(200, PREDICTION))
+    with pytest.raises(ModelError, match="timed out"):
+        call(service, "predictBatch", [{}])
+    assert len(service.calls) == 1
+
+
+def testClientErrorIsNotRetried(call) -> None:
+    service = Service(response(422), response(200, PREDICTION))
+    with pytest.raises(ModelError) as err:
+        call(service, "predictBatch", [{}])
+    assert err.value.status_code == 422
+    assert len(service.calls) == 1
+
+
+def testVersionNoLongerServed(call) -> None:
+    service = Service(response(404, {"detail": "Model v0 is not served"}))
+    with pytest.raises(ModelError, match="Model v0 is no longer served") as err:
+        call(service, "times", "v0")
+    assert err.value.status_code == 404
+    assert service.calls == ["/v1/finlytik/model/v0"]
+
+
+def testTimesAreFetchedOncePerVersion(call) -> None:
+    service = Service(response(200, {"model_version": "v1", "times": [1., 2.]}))
+    assert call(service, "times", "v1") == [1., 2.]
+    assert call(service, "times", "v1") == [1., 2.]
+    assert len(service.calls) == 1
+
+
+def testBackoffDoubles(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "MODEL_RETRY_BACKOFF_SECONDS", 0.2)
+    assert [client.backoff(attempt) for attempt in range(3)] == [0.2, 0.4, 0.8]
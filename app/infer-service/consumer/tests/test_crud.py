@@ -0,0 +1,45 @@
+from consumer import crud, report
+from consumer.models.profile import Profile
+
+SCORE_KEYS = {"id", "times", "hazard_score", "risk_score", "survival_score", "model_version"}
+
+
+class Session:
+    """Records the statements a crud call executes"""
+
+    def __init__(self):
+        self.executed = []
+        self.commits = 0
+        self.refreshed = []
+
+    def execute(self, statement, params=None):
+        self.executed.append((statement, params))
+
+    def commit(self):
+        self.commits += 1
+
+    def refresh(self, obj):
+        self.refreshed.append(obj)
+
+
+def testScoresAreWrittenWithOneBulkUpdate() -> None:
+    db = Session()
+    messages = [{"profile_id": "1"}, {"profile_id": "2"}]
+    prediction = {"model_version": "v1", "hazard": [[.1, .2], [.3, .4]], "risk": [1., 2.],
+                  "survival": [[.9, .8], [.7, .6]]}
+    report.storeBatch(messages, [1, 2], prediction, [1., 2.], db, crud)
+
+    assert len(db.executed) == 1 and db.commits == 1 and not db.refreshed
+    statement, scores = db.executed[0]
+    assert statement.is_update and statement.entity_description["entity"] is Profile
+    assert [set(score) for score in scores] == [SCORE_KEYS] * 2
+    assert SCORE_KEYS <= set(Profile.__table__.columns.keys())
+    assert scores[1] == {"id": 2, "times": [1., 2.], "hazard_score": [.3, .4],
+                         "risk_score": [2.], "survival_score": [.7, .6],
+                         "model_version": "v1"}
+
+
+def testNothingIsWrittenWithoutScores() -> None:
+    db = Session()
+    crud.profile.updateScores(db, scores=[])
+    assert not db.executed and not db.commits
@@ -0,0 +1,81 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from consumer import client
+from consumer.client import ModelError
+from consumer.core.config import settings
+from consumer.crud.crud_profile import MODEL_FIELDS
+from consumer.embedded import AsyncEmbeddedModel, EmbeddedModel, loadClassifier
+
+MODELPRODUCT = Path(__file__).resolve().parents[4] / "training" / "modelproduct"
+
+CATEGORIES = {"credit_mix": "Good", "payment_of_min_amount": "No",
+              "payment_behaviour": "Low_spent_Small_value_payments"}
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return loadClassifier(str(MODELPRODUCT))
+
+
+@pytest.fixture
+def model_dir(classifier, tmp_path) -> Path:
+    """Artifacts of a forest whose two trees split on age, exported like mlflowmanager does"""
+    from engine import CompiledForest
+    from features import SEPARATOR, FeatureTransform
+
+    columns = [field for field in MODEL_FIELDS if field not in CATEGORIES]
+    columns += [f"{field}{SEPARATOR}{value}" for field, value in CATEGORIES.items()]
+    FeatureTransform(columns, np.full(len(columns), 0.1), np.zeros(len(columns))).save(
+        tmp_path / "transform.npz")
+    age = columns.index("age")
+    chf = np.cumsum(np.full((4, 3), 0.1), axis=1) * [[1], [2], [3], [4]]
+    CompiledForest(times=np.array([1., 2., 3.]), roots=np.array([0, 3]),
+                   feature=np.array([age, 0, 0] * 2), threshold=np.array([3., 0., 0.] * 2),
+                   left=np.array([1, 1, 2, 4, 4, 5]), right=np.array([2, 1, 2, 5, 4, 5]),
+                   leaf_slot=np.array([-1, 0, 1, -1, 2, 3]), leaf_chf=chf,
+                   leaf_survival=np.exp(-chf), leaf_risk=chf.sum(axis=1), depth=1).save(
+        tmp_path / "forest")
+    return tmp_path
+
+
+def row(age: float) -> dict:
+    return {**{field: 1. for field in MODEL_FIELDS}, **CATEGORIES, "age": age}
+
+
+def testEmbeddedModelAnswersLikeTheService(classifier, model_dir: Path) -> None:
+    model = EmbeddedModel(str(model_dir))
+    served = classifier.loadArtifacts(str(model_dir))
+    assert model.version() == served.version
+    prediction = model.predictBatch([row(20.), row(40.)])
+    assert prediction["model_version"] == served.version
+    assert np.allclose(prediction["hazard"], [[.2] * 3, [.3] * 3])
+    assert np.allclose(prediction["risk"], [1.2, 1.8])
+    assert isinstance(prediction["survival"][0][0], float)
+    assert model.predict(row(20.))["hazard"] == prediction["hazard"][0]
+    assert model.times(served.version) == [1., 2., 3.]
+    with pytest.raises(ModelError, match="no longer served"):
+        model.times("other")
+
+
+def testEmbeddedModelReducesCurvesLikeTheService(classifier, model_dir: Path,
+                                                 monkeypatch) -> None:
+    full = EmbeddedModel(str(model_dir))
+    monkeypatch.setattr(classifier.settings, "CURVE_MAX_HORIZON", 2.)
+    cut = EmbeddedModel(str(model_dir))
+    assert cut.version() != full.version()
+    assert cut.version() == classifier.loadArtifacts(str(model_dir)).version
+    assert len(cut.predictBatch([row(20.)])["hazard"][0]) == 2
+
+
+def testModelModeChoosesTheClient(classifier, model_dir: Path, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "EMBEDDED_MODEL_DIR", str(model_dir))
+    monkeypatch.setattr(settings, "MODEL_MODE", "embedded")
+    assert isinstance(client.modelClient(), EmbeddedModel)
+    assert isinstance(client.asyncModelClient(), AsyncEmbeddedModel)
+    monkeypatch.setattr(settings, "MODEL_MODE", "remote")
+    model = client.modelClient()
+    assert isinstance(model, client.ModelClient)
+    model.close()
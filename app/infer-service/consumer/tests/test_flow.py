@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from consumer.client import ModelError
+from consumer.core.config import settings
+from consumer.flow import AdaptiveLimit, CircuitBreaker, modelFailed
+
+
+@pytest.fixture
+def breakerSettings(monkeypatch):
+    monkeypatch.setattr(settings, "BREAKER_WINDOW", 10)
+    monkeypatch.setattr(settings, "BREAKER_MIN_CALLS", 4)
+    monkeypatch.setattr(settings, "BREAKER_ERROR_RATE", 0.5)
+    monkeypatch.setattr(settings, "BREAKER_SLOW_SECONDS", 1.0)
+    monkeypatch.setattr(settings, "BREAKER_SLOW_RATE", 0.5)
+
+
+def testLimitGrowsAdditivelyAndShrinksMultiplicatively() -> None:
+    async def run():
+        limit = AdaptiveLimit(initial=4, minimum=1, maximum=8, target=1.0, backoff=0.5)
+        for _ in range(4):
+            await limit.acquire()
+            await limit.release(0.1, True)
+        grown = limit.limit
+        await limit.acquire()
+        await limit.release(2.0, True)
+        slow = limit.limit
+        await limit.acquire()
+        await limit.release(0.1, False)
+        return grown, slow, limit.limit
+
+    grown, slow, failed = asyncio.run(run())
+    assert 4.9 < grown < 5.
+    assert slow == pytest.approx(grown / 2)
+    assert failed == pytest.approx(max(1, slow / 2))
+
+
+def testLimitStaysWithinBounds() -> None:
+    async def run():
+        limit = AdaptiveLimit(initial=10, minimum=2, maximum=3, target=1.0, backoff=0.1)
+        capped = limit.limit
+        await limit.acquire()
+        await limit.release(5.0, False)
+        return capped, limit.limit
+
+    assert asyncio.run(run()) == (3., 2.)
+
+
+def testAcquireWaitsForAFreeSlot() -> None:
+    async def run():
+        limit = AdaptiveLimit(initial=1, minimum=1, maximum=1, target=1.0, backoff=0.5)
+        await limit.acquire()
+        waiting = asyncio.create_task(limit.acquire())
+        await asyncio.sleep(0)
+        blocked = not waiting.done()
+        await limit.release(0.1, True)
+        await asyncio.wait_for(waiting, 1)
+        return blocked
+
+    assert asyncio.run(run())
+
+
+def testBreakerOpensOnErrorRate(breakerSettings) -> None:
+    breaker = CircuitBreaker()
+    for ok in (True, False, True):
+        breaker.record(0.1, ok)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record(0.1, False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened.is_set()
+
+
+def testBreakerOpensOnSlowRate(breakerSettings) -> None:
+    breaker = CircuitBreaker()
+    for seconds in (0.1, 2.0, 0.1, 2.0):
+        breaker.record(seconds, True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def testHalfOpenBreakerClosesAfterGoodCalls(breakerSettings) -> None:
+    breaker = CircuitBreaker()
+    breaker.trip()
+    breaker.halfOpen()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.opened.is_set()
+    for _ in range(settings.BREAKER_MIN_CALLS):
+        breaker.record(0.1, True)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def testHalfOpenBreakerReopensOnFirstBadCall(breakerSettings) -> None:
+    breaker = CircuitBreaker()
+    breaker.trip()
+    breaker.halfOpen()
+    breaker.record(0.1, True)
+    breaker.record(2.0, True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def testOnlyModelSideErrorsCountAsFailures() -> None:
+    assert modelFailed(ModelError("unreachable"))
+    assert modelFailed(ModelError("overloaded", 503))
+    assert not modelFailed(ModelError("invalid profile", 422))
@@ -0,0 +1,101 @@
+import json
+from types import SimpleNamespace
+
+import pika
+import pytest
+
+from consumer import main as consumer, report, retry
+from consumer.core.config import settings
+from consumer.retry import ATTEMPTS_HEADER, ERROR_HEADER
+
+
+class Channel:
+    """Blocking channel recording what the consumer callback does with a message"""
+
+    def __init__(self):
+        self.callback = None
+        self.published = []
+        self.acked = []
+        self.nacked = []
+
+    def confirm_delivery(self):
+        pass
+
+    def queue_declare(self, queue, durable=False, arguments=None):
+        pass
+
+    def basic_consume(self, queue, on_message_callback):
+        self.callback = on_message_callback
+
+    def start_consuming(self):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self.published.append((routing_key, body, properties))
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+    def basic_nack(self, delivery_tag):
+        self.nacked.append(delivery_tag)
+
+
+class Connection:
+    def __init__(self, parameters):
+        self.channel_ = Channel()
+
+    def channel(self):
+        return self.channel_
+
+    def close(self):
+        pass
+
+
+class Session:
+    def __init__(self):
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def deliver(monkeypatch):
+    """Runs consumer.main against a fake broker and returns a message delivery function"""
+    monkeypatch.setattr(consumer.pika, "BlockingConnection", Connection)
+    monkeypatch.setattr(consumer.signal, "signal", lambda signum, handler: None)
+    channels = []
+    monkeypatch.setattr(retry, "declare", lambda channel: channels.append(channel))
+    monkeypatch.setattr(report, "model", SimpleNamespace(version=lambda: "v1"))
+    db = Session()
+    consumer.main(db)
+    channel = channels[0]
+
+    def deliver(body: bytes):
+        channel.callback(channel, SimpleNamespace(delivery_tag=1),
+                         pika.BasicProperties(message_id="m-1"), body)
+        return channel, db
+    return deliver
+
+
+@pytest.mark.parametrize("body", [b"not json", json.dumps({"username": "a@b.com"}).encode()])
+def testPoisonMessageIsScheduledForRetry(deliver, body: bytes) -> None:
+    channel, db = deliver(body)
+    assert db.rollbacks == 1
+    assert channel.acked == [1] and not channel.nacked
+    routing_key, published, properties = channel.published[0]
+    assert routing_key == retry.delayQueue(settings.RETRY_DELAYS_SECONDS[0])
+    assert published == body
+    assert properties.headers[ATTEMPTS_HEADER] == 1
+    assert properties.message_id == "m-1"
+
+
+def testDatabaseErrorIsScheduledForRetry(deliver, monkeypatch) -> None:
+    def start(message, db, crud, channel):
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(report, "start", start)
+    channel, db = deliver(json.dumps({"profile_id": "1"}).encode())
+    assert db.rollbacks == 1
+    assert channel.acked == [1]
+    assert channel.published[0][2].headers[ERROR_HEADER] == "connection lost"
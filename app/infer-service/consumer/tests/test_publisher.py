@@ -0,0 +1,107 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aio_pika.exceptions import DeliveryError, PublishError
+from pamqp.commands import Basic
+
+from consumer.core.config import settings
+from consumer.publisher import Publisher
+
+
+class Exchange:
+    """Default exchange whose publishes wait until the test confirms or fails them"""
+
+    def __init__(self):
+        self.published = []
+        self.confirms = []
+
+    async def publish(self, message, routing_key, mandatory=False):
+        confirm = asyncio.get_running_loop().create_future()
+        self.published.append((message, routing_key, mandatory))
+        self.confirms.append(confirm)
+        await confirm
+
+
+class Channel:
+    def __init__(self, **options):
+        self.options = options
+        self.default_exchange = Exchange()
+
+
+class Connection:
+    async def channel(self, **options):
+        return Channel(**options)
+
+
+# what aio-pika raises for a nacked message and for an unroutable mandatory one
+NACKED = DeliveryError(None, Basic.Nack())
+RETURNED = PublishError(SimpleNamespace(delivery=Basic.Return(
+    reply_code=312, reply_text="NO_ROUTE", routing_key="profile")), None)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def testChannelConfirmsAndRaisesOnReturns() -> None:
+    publisher = asyncio.run(Publisher.open(Connection()))
+    assert publisher.channel.options == {"publisher_confirms": True, "on_return_raises": True}
+    assert publisher.routing_key == settings.PROFILE_QUEUE
+
+
+def testPublishWaitsForItsConfirm() -> None:
+    async def run():
+        publisher = Publisher(Channel(), "profile", window=4)
+        exchange = publisher.channel.default_exchange
+        publishing = asyncio.create_task(publisher.publish(b"{}", headers={"a": 1},
+                                                           correlation_id="c"))
+        await settle()
+        waiting = not publishing.done()
+        exchange.confirms[0].set_result(None)
+        await publishing
+        return waiting, exchange.published[0]
+
+    waiting, (message, routing_key, mandatory) = asyncio.run(run())
+    assert waiting
+    assert (routing_key, mandatory) == ("profile", True)
+    assert message.headers == {"a": 1} and message.correlation_id == "c"
+    assert message.delivery_mode == 2
+
+
+def testWindowBoundsOutstandingPublishes() -> None:
+    async def run():
+        publisher = Publisher(Channel(), "profile", window=2)
+        exchange = publisher.channel.default_exchange
+        tasks = [asyncio.create_task(publisher.publish(b"{}")) for _ in range(3)]
+        await settle()
+        outstanding = len(exchange.published)
+        exchange.confirms[0].set_result(None)
+        await settle()
+        released = len(exchange.published)
+        for confirm in exchange.confirms[1:]:
+            confirm.set_result(None)
+        await asyncio.gather(*tasks)
+        return outstanding, released
+
+    assert asyncio.run(run()) == (2, 3)
+
+
+@pytest.mark.parametrize("error", [NACKED, RETURNED], ids=["nack", "return"])
+def testNackOrReturnRaisesAndFreesTheSlot(error: Exception) -> None:
+    async def run():
+        publisher = Publisher(Channel(), "profile", window=1)
+        exchange = publisher.channel.default_exchange
+        failing = asyncio.create_task(publisher.publish(b"{}"))
+        await settle()
+        exchange.confirms[0].set_exception(error)
+        with pytest.raises(type(error)):
+            await failing
+        following = asyncio.create_task(publisher.publish(b"{}"))
+        await settle()
+        exchange.confirms[1].set_result(None)
+        await following
+        return len(exchange.published)
+
+    assert asyncio.run(run()) == 2
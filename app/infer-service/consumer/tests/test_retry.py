@@ -0,0 +1,100 @@
+import asyncio
+
+import pika
+
+from consumer import retry
+from consumer.aioconsumer import Consumer
+from consumer.core.config import settings
+from consumer.retry import ATTEMPTS_HEADER, ERROR_HEADER, Retry
+
+
+def testFirstFailureWaitsInFirstDelayQueue() -> None:
+    scheduled = Retry(None, "boom")
+    assert scheduled.attempts == 1
+    assert not scheduled.dead
+    assert scheduled.routing_key == retry.delayQueue(settings.RETRY_DELAYS_SECONDS[0])
+    assert scheduled.headers == {ATTEMPTS_HEADER: 1, ERROR_HEADER: "boom"}
+
+
+def testLastDelayIsReusedOnceDelaysRunOut(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "RETRY_DELAYS_SECONDS", [1.0, 5.0])
+    monkeypatch.setattr(settings, "RETRY_MAX_ATTEMPTS", 10)
+    scheduled = Retry({ATTEMPTS_HEADER: 4}, "boom")
+    assert scheduled.attempts == 5
+    assert scheduled.routing_key == retry.delayQueue(5.0)
+
+
+def testMessageIsDeadLetteredAfterMaxAttempts() -> None:
+    scheduled = Retry({ATTEMPTS_HEADER: settings.RETRY_MAX_ATTEMPTS - 1, "trace": "abc"}, "boom")
+    assert scheduled.dead
+    assert scheduled.routing_key == settings.DEAD_LETTER_QUEUE
+    assert scheduled.headers["trace"] == "abc"
+
+
+def testDelayQueuesDeadLetterBackToDetailQueue() -> None:
+    queues = retry.queues()
+    assert queues[settings.DEAD_LETTER_QUEUE] == {}
+    for delay in settings.RETRY_DELAYS_SECONDS:
+        arguments = queues[retry.delayQueue(delay)]
+        assert arguments["x-message-ttl"] == int(delay * 1000)
+        assert arguments["x-dead-letter-routing-key"] == settings.DETAIL_QUEUE
+
+
+def testPropertiesAreCarriedOver() -> None:
+    properties = pika.BasicProperties(content_type="application/json", message_id="m-1",
+                                      expiration="60000", headers={"a": 1})
+    assert retry.properties(properties) == {"content_type": "application/json",
+                                            "message_id": "m-1"}
+
+
+class Message:
+    def __init__(self):
+        self.body = b'{"profile_id": "1"}'
+        self.headers = {}
+        self.content_type = "application/json"
+        self.message_id = "m-1"
+        self.acked = self.nacked = False
+
+    async def ack(self):
+        self.acked = True
+
+    async def nack(self):
+        self.nacked = True
+
+
+class Publisher:
+    def __init__(self, fail_on):
+        self.fail_on = fail_on
+        self.published = []
+
+    async def publish(self, body, routing_key=None, headers=None, **properties):
+        if routing_key == self.fail_on:
+            raise ConnectionError("not confirmed")
+        self.published.append((routing_key, headers, properties))
+
+
+def testFailedPublishIsRetriedNotRequeued() -> None:
+    async def run():
+        # the profile message goes to the publisher's own routing key (None here)
+        publisher = Publisher(fail_on=None)
+        message = Message()
+        await Consumer(publisher, None).finish(message, {"profile_id": "1"}, None)
+        return message, publisher.published
+
+    message, published = asyncio.run(run())
+    assert message.acked and not message.nacked
+    [(routing_key, headers, properties)] = published
+    assert routing_key == retry.delayQueue(settings.RETRY_DELAYS_SECONDS[0])
+    assert headers[ATTEMPTS_HEADER] == 1
+    assert properties == {"content_type": "application/json", "message_id": "m-1"}
+
+
+def testUnscheduledRetryIsRequeued() -> None:
+    async def run():
+        message = Message()
+        await Consumer(Publisher(fail_on=retry.delayQueue(settings.RETRY_DELAYS_SECONDS[0])),
+                       None).retry(message, "boom")
+        return message
+
+    message = asyncio.run(run())
+    assert message.nacked and not message.acked
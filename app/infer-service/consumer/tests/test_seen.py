@@ -0,0 +1,118 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from consumer import aioconsumer, report
+from consumer.crud.crud_profile import MODEL_FIELDS
+from consumer.seen import SeenSet, messageKey
+
+
+def detail(profile_id: int) -> bytes:
+    return json.dumps({"profile_id": str(profile_id), "username": "a@b.com",
+                       "processed": False}).encode()
+
+
+def testSeenSetDropsOldestKeys() -> None:
+    seen = SeenSet(max_size=2)
+    for key in ("a", "b", "a", "c"):
+        seen.add(key)
+    assert "a" in seen and "c" in seen
+    assert "b" not in seen
+    assert None not in seen
+
+
+def testDisabledSeenSetKeepsNothing() -> None:
+    seen = SeenSet(max_size=0)
+    seen.add("a")
+    assert "a" not in seen
+
+
+def testMessageKey() -> None:
+    assert messageKey(detail(7), "m-1") == "m-1"
+    assert messageKey(detail(7)) == "7"
+    assert messageKey(b"not json") is None
+
+
+class Profiles:
+    def __init__(self, rows):
+        self.rows = rows
+        self.scores = None
+
+    def getFeatures(self, db, ids):
+        return [row for row in self.rows if str(row[0]) in ids]
+
+    def updateScores(self, db, scores):
+        self.scores = scores
+
+
+def row(profile_id: int, version=None, notified_at=None) -> tuple:
+    return (profile_id, version, notified_at) + (0.,) * len(MODEL_FIELDS)
+
+
+def testRedeliveredProfilesAreNotScoredAgain() -> None:
+    notified_at = datetime.now(timezone.utc)
+    crud = SimpleNamespace(profile=Profiles([row(1), row(2, "v1"), row(3, "v1", notified_at),
+                                             row(4, "v0")]))
+    messages, ids, model_data, current, notified = report.prepareBatch(
+        [detail(i) for i in (1, 2, 3, 4, 5)], None, crud, "v1")
+    assert ids == [1, 4]
+    assert len(model_data) == 2
+    assert current == {"2"} and notified == {"3"}
+
+    prediction = {"model_version": "v1", "hazard": [[.1], [.2]], "risk": [1., 2.],
+                  "survival": [[.9], [.8]]}
+    results = report.storeBatch(messages, ids, prediction, [1.], None, crud, current, notified)
+    assert [scored["profile_id"] for scored, _ in results if scored] == ["1", "2", "4"]
+    assert results[2] == (None, None)
+    assert results[4][1] == "Profile 5 not found"
+    assert [score["id"] for score in crud.profile.scores] == [1, 4]
+    assert {score["model_version"] for score in crud.profile.scores} == {"v1"}
+
+
+class Message:
+    def __init__(self, profile_id: int, events: list):
+        self.body = detail(profile_id)
+        self.message_id = None
+        self.headers = {}
+        self.events = events
+
+    async def ack(self):
+        self.events.append(("ack", messageKey(self.body)))
+
+    async def nack(self):
+        self.events.append(("nack", messageKey(self.body)))
+
+
+class Publisher:
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, body, routing_key=None, headers=None, **properties):
+        self.published.append(json.loads(body)["profile_id"])
+
+
+def testProfilesAreMarkedNotifiedBeforeTheAck(monkeypatch) -> None:
+    events = []
+    monkeypatch.setattr(aioconsumer, "markNotified", lambda scored: events.append(
+        ("marked", [message["profile_id"] for message in scored])))
+
+    async def score(bodies):
+        events.append(("scored", [messageKey(body) for body in bodies]))
+        return [(None, None) if messageKey(body) == "2"
+                else ({**json.loads(body), "processed": True}, None) for body in bodies]
+
+    async def run():
+        publisher = Publisher()
+        consumer = aioconsumer.Consumer(publisher, None)
+        consumer.score = score
+        await consumer.handleBatch([Message(1, events), Message(2, events)])
+        await consumer.handleBatch([Message(1, events)])
+        return publisher.published
+
+    assert asyncio.run(run()) == ["1"]
+    assert events == [("scored", ["1", "2"]),
+                      ("ack", "2"),
+                      ("marked", ["1"]),
+                      ("ack", "1"),
+                      ("ack", "1")]
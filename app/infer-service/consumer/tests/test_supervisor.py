@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from consumer.core.config import settings
+from consumer.supervisor import Supervisor
+
+
+class Process:
+    def __init__(self, target=None, args=(), name=None):
+        self.pid = 1
+        self.alive = True
+
+    def start(self):
+        pass
+
+    def is_alive(self):
+        return self.alive
+
+
+@pytest.fixture
+def supervisor(monkeypatch, tmp_path) -> Supervisor:
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    supervisor = Supervisor(2)
+    monkeypatch.setattr(supervisor.context, "Process", Process)
+    for index in range(2):
+        supervisor.spawn(index)
+    return supervisor
+
+
+def healthy(supervisor: Supervisor) -> list:
+    return [worker["healthy"] for worker in supervisor.health()[1]]
+
+
+def testWorkerIsHealthyOnlyOnceItBeats(supervisor: Supervisor) -> None:
+    assert healthy(supervisor) == [False, False]
+    supervisor.heartbeats[0] = time.time()
+    assert healthy(supervisor) == [True, False]
+    supervisor.processes[0].alive = False
+    assert healthy(supervisor) == [False, False]
+
+
+def testRespawnedWorkerDoesNotInheritTheLastBeat(supervisor: Supervisor) -> None:
+    supervisor.heartbeats[0] = time.time()
+    supervisor.spawn(0)
+    assert healthy(supervisor) == [False, False]
+
+
+def testRecentlyRestartedWorkerIsNotHealthy(supervisor: Supervisor) -> None:
+    supervisor.restarts[0] = 1
+    supervisor.spawn(0)
+    supervisor.heartbeats[0] = time.time()
+    assert healthy(supervisor) == [False, False]
+    supervisor.started[0] -= 3 * settings.CONSUMER_HEARTBEAT_SECONDS
+    assert healthy(supervisor) == [True, False]
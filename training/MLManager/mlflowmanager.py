@@ -8,12 +8,15 @@ from pysurvival.utils.metrics import concordance_index
 from pysurvival.utils.display import integrated_brier_score
 from pysurvival.utils.display import compare_to_actual
 from pysurvival.utils import save_model
+from modelproduct.engine import compileForest, matchesModel
+from modelproduct.features import compileTransform
 import mlflow
 from mlflow import MlflowClient
 import ast
 from typing import List
 import joblib
 from pathlib import Path
+from types import SimpleNamespace
 import numpy as np
 
 path = Path(__file__).parent / ""
@@ -139,6 +142,43 @@ def experimentModel(exp_info, tr_data, te_data, param_grid, trees: int, kind: st
     return c_index, ibs
 
 
+def exportForest(clf, X, path_file: str, curve_grid: List[float] = None,
+                 curve_max_horizon: float = None, curve_dtype: str = None) -> bool:
+    """
+    Flattens the fitted forest into the array format served by modelproduct and saves it
+    if it reproduces the pysurvival predictions on X. The served curves can be resampled
+    onto curve_grid, cut at curve_max_horizon and stored as curve_dtype
+    """
+    try:
+        forest = compileForest(clf, X.shape[1])
+        matches = matchesModel(forest, clf, X)
+    except Exception as err:
+        print(f"Forest could not be compiled, skipping export: {err}")
+        return False
+    if not matches:
+        print("Compiled forest does not match the model predictions, skipping export")
+        return False
+    if curve_grid is not None or curve_max_horizon is not None or curve_dtype is not None:
+        forest = forest.reduce(dtype=curve_dtype, max_horizon=curve_max_horizon,
+                               grid=curve_grid)
+    forest.save(path_file)
+    return True
+
+
+def exportTransform(data_pipe, records: List[dict], path_file: str) -> bool:
+    """
+    Folds the fitted transformation pipeline into the fixed column affine transform served
+    by modelproduct and saves it if it reproduces the pipeline output on records
+    """
+    transform = compileTransform(data_pipe)
+    compiled = transform.transform([SimpleNamespace(**record) for record in records])
+    if not np.allclose(compiled, data_pipe.transform(records)):
+        print("Compiled transform does not match the pipeline output, skipping export")
+        return False
+    transform.save(path_file)
+    return True
+
+
 def updateProd(exp_info, client, run):
     """
     Transitions a model to Production Version
@@ -211,10 +251,27 @@ def buildModel(exp_info: dict, tr_data: dict, te_data: dict, rev_run):
 
         joblib.dump(data_pipe, f"{path}/../tmp/data_pipe.sav")
         save_model(clf, f"{path}/../tmp/model.zip")
+        exported = exportForest(clf, _te_data['X'], f"{path}/../tmp/forest",
+                                curve_grid=exp_info.get('curve_grid'),
+                                curve_max_horizon=exp_info.get('curve_max_horizon'),
+                                curve_dtype=exp_info.get('curve_dtype'))
+        compiled = exportTransform(data_pipe, te_data['X'], f"{path}/../tmp/transform.npz")
 
         # Log Params, Artifact and Results
         mlflow.log_artifact(f"{path}/../tmp/data_pipe.sav")
         mlflow.log_artifact(f"{path}/../tmp/model.zip")
+        if exported:
+            mlflow.log_artifacts(f"{path}/../tmp/forest", artifact_path="forest")
+            mlflow.log_params({key: exp_info[key] for key in
+                               ('curve_max_horizon', 'curve_dtype')
+                               if exp_info.get(key) is not None})
+            # A grid is too long for an mlflow param, only its size is logged as one
+            if exp_info.get('curve_grid') is not None:
+                mlflow.log_param('curve_grid_points', len(exp_info['curve_grid']))
+                mlflow.log_dict({'curve_grid': list(exp_info['curve_grid'])},
+                                "curve_grid.json")
+        if compiled:
+            mlflow.log_artifact(f"{path}/../tmp/transform.npz")
         mlflow.log_params(param_grid)
         mlflow.log_param("trees", trees)
         mlflow.log_dict(results, "results.json")
@@ -294,4 +351,4 @@ def downloadModel(tracking_uri: str, model_name: str = None, search_prefix: str
         run_id = version_info[0].latest_versions[0].run_id
 
     mlflow.artifacts.download_artifacts(
-        run_id=run_id, dst_path=f"{path}/../modelproduct /")
+        run_id=run_id, dst_path=f"{path}/../modelproduct/")
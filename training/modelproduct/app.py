@@ -1,5 +1,9 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from predict import predict
+import classifier
+import metrics
+import time
 import warnings
 with warnings.catch_warnings():
     warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -9,3 +13,47 @@ app = FastAPI(title="Finlytik ML API",
               description="API for Credit Risk", version="1.0")
 
 app.include_router(predict, prefix='/v1')
+
+# endpoint label of the prediction routes, every other path under them counts as "other"
+ENDPOINTS = {"/v1/finlytik/predict", "/v1/finlytik/predict/batch"}
+
+
+class PredictionMetrics:
+    """
+    Counts the prediction requests by status and tracks those in flight. A plain ASGI
+    middleware, so predictions run without the extra task and response stream of
+    BaseHTTPMiddleware
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/v1/finlytik/predict"):
+            await self.app(scope, receive, send)
+            return
+        # read back as request.state.started when the body has been validated
+        scope.setdefault("state", {})["started"] = time.perf_counter()
+        status = 500
+
+        async def sendWithStatus(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with metrics.IN_FLIGHT.track_inprogress():
+            try:
+                await self.app(scope, receive, sendWithStatus)
+            finally:
+                endpoint = scope["path"] if scope["path"] in ENDPOINTS else "other"
+                version = classifier.current.version if classifier.current else ""
+                metrics.REQUESTS.labels(endpoint, str(status), version).inc()
+
+
+app.add_middleware(PredictionMetrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def getMetrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,81 @@
+import asyncio
+from typing import Optional
+
+import executor
+
+
+class MicroBatcher:
+    """
+    Coalesces single profile predictions into batches.
+
+    Requests are queued until max_size rows are waiting or max_wait_ms has passed
+    since the first one, the batch is scored with one vectorized forest evaluation
+    and each waiting request gets its own row back. At most max_inflight batches
+    are scored concurrently
+    """
+
+    def __init__(self, max_size: int, max_wait_ms: float, max_inflight: int = 1):
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue: Optional[asyncio.Queue] = None
+        self.inflight: Optional[asyncio.Semaphore] = None
+        self.max_inflight = max_inflight
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.inflight = asyncio.Semaphore(self.max_inflight)
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+
+    async def submit(self, details):
+        """Returns the Prediction of a single profile"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((details, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        details, future = await self.queue.get()
+        rows, futures = [details], [future]
+        deadline = loop.time() + self.max_wait
+        while len(rows) < self.max_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                details, future = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            rows.append(details)
+            futures.append(future)
+        return rows, futures
+
+    async def _score(self, rows, futures):
+        try:
+            prediction = await executor.predictRows(rows)
+        except Exception as err:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(err)
+            return
+        finally:
+            self.inflight.release()
+        for i, future in enumerate(futures):
+            if not future.done():
+                future.set_result(prediction.row(i))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.inflight.acquire()
+            rows, futures = await self._collect()
+            loop.create_task(self._score(rows, futures))
@@ -0,0 +1,190 @@
+"""
+Benchmark of the prediction path: transform, inference and serialization timed
+separately for single rows and batches.
+
+Models of each kind are fitted on synthetic profiles generated from the Details
+schema (pysurvival and sklearn are needed for that), or the served artifacts of a
+model directory are benchmarked with --artifacts. Results are written as JSON so
+runs can be diffed when the model or the pipeline changes.
+
+    python bench.py --kinds rsf csf --trees 50 200 --batches 1 64 512 --output bench.json
+    python bench.py --artifacts ./ --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import orjson
+
+from engine import CompiledForest, compileForest, matchesModel
+from features import FeatureTransform, compileTransform
+from serialize import CurveEncoding, encodeCurves
+
+SEED = 42
+
+CATEGORIES = {
+    "credit_mix": ["Bad", "Good", "Standard"],
+    "payment_of_min_amount": ["NM", "No", "Yes"],
+    "payment_behaviour": ["High_spent_Large_value_payments",
+                          "High_spent_Medium_value_payments",
+                          "High_spent_Small_value_payments",
+                          "Low_spent_Large_value_payments",
+                          "Low_spent_Medium_value_payments",
+                          "Low_spent_Small_value_payments"],
+}
+
+# (low, high) of the numeric Details fields after the cleaning done in the
+# training data notebook
+RANGES = {
+    "age": (18, 60),
+    "annual_income": (7000, 180000),
+    "monthly_inhand_salary": (300, 15000),
+    "num_bank_accounts": (0, 10),
+    "num_credit_card": (0, 10),
+    "interest_rate": (1, 10),
+    "num_of_loan": (1, 9),
+    "num_of_delayed_payment": (1, 25),
+    "changed_credit_limit": (0.5, 30),
+    "num_credit_inquiries": (0, 15),
+    "outstanding_debt": (0, 5000),
+    "credit_utilization_ratio": (20, 50),
+    "credit_history_age": (0, 33),
+    "total_emi_per_month": (0, 1500),
+    "amount_invested_monthly": (0, 1500),
+    "monthly_balance": (0, 1500),
+}
+
+
+def syntheticProfiles(n: int, seed: int = SEED) -> list:
+    """Profiles with every Details field drawn uniformly from its training range"""
+    rng = np.random.default_rng(seed)
+    columns = {field: rng.uniform(low, high, n) for field, (low, high) in RANGES.items()}
+    columns.update({field: rng.choice(values, n) for field, values in CATEGORIES.items()})
+    return [{field: (str(values[i]) if field in CATEGORIES else float(values[i]))
+             for field, values in columns.items()} for i in range(n)]
+
+
+def timeit(fn, repeats: int) -> dict:
+    fn()
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - started)
+    samples = np.asarray(samples) / 1e6
+    return {"median_ms": float(np.median(samples)),
+            "p95_ms": float(np.percentile(samples, 95)),
+            "min_ms": float(samples.min())}
+
+
+def fitModel(kind: str, trees: int, records: list, seed: int = SEED):
+    """Fits the pipeline and a pysurvival forest of the given kind on synthetic data"""
+    from sklearn.feature_extraction import DictVectorizer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import MinMaxScaler, StandardScaler
+    from pysurvival.models.survival_forest import (ConditionalSurvivalForestModel,
+                                                   RandomSurvivalForestModel)
+
+    rng = np.random.default_rng(seed)
+    data_pipe = Pipeline([('dv', DictVectorizer(sparse=False)),
+                          ('minmax', MinMaxScaler()),
+                          ('std', StandardScaler())])
+    X = data_pipe.fit_transform(records)
+    T = rng.integers(0, 60, len(records))
+    E = (rng.random(len(records)) < 0.11).astype(int)
+    output_kind = RandomSurvivalForestModel if kind == "rsf" else ConditionalSurvivalForestModel
+    clf = output_kind(num_trees=trees)
+    clf.fit(X, T, E, max_features="sqrt", min_node_size=18, seed=seed)
+    return data_pipe, clf
+
+
+def benchStages(label: dict, transform: FeatureTransform, forest: CompiledForest,
+                batches: list, repeats: int, data_pipe=None, model=None) -> list:
+    results = []
+    profiles = syntheticProfiles(max(batches))
+    rows = [SimpleNamespace(**profile) for profile in profiles]
+
+    def record(batch, stage, impl, timing):
+        rate = batch / (timing["median_ms"] / 1e3) if timing["median_ms"] else None
+        results.append({**label, "batch": batch, "stage": stage, "impl": impl,
+                        **timing, "rows_per_s": rate})
+
+    for batch in batches:
+        X = transform.transform(rows[:batch])
+        hazard, survival, risk = forest.predict(X)
+
+        record(batch, "transform", "compiled",
+               timeit(lambda: transform.transform(rows[:batch]), repeats))
+        record(batch, "inference", "compiled",
+               timeit(lambda: forest.predict(X), repeats))
+        for encoding in CurveEncoding:
+            record(batch, "serialization", encoding.value,
+                   timeit(lambda: orjson.dumps({"hazard": encodeCurves(hazard, encoding),
+                                                "risk": risk,
+                                                "survival": encodeCurves(survival, encoding)},
+                                               option=orjson.OPT_SERIALIZE_NUMPY), repeats))
+        if data_pipe is not None:
+            record(batch, "transform", "sklearn",
+                   timeit(lambda: data_pipe.transform(profiles[:batch]), repeats))
+        if model is not None:
+            record(batch, "inference", "pysurvival",
+                   timeit(lambda: (model.predict_hazard(X), model.predict_survival(X),
+                                   model.predict_risk(X)), repeats))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--kinds", nargs="+", default=["rsf", "csf"], choices=["rsf", "csf"])
+    parser.add_argument("--trees", nargs="+", type=int, default=[50, 200, 400])
+    parser.add_argument("--batches", nargs="+", type=int, default=[1, 16, 128, 512])
+    parser.add_argument("--train-rows", type=int, default=4000)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--artifacts", help="benchmark the artifacts of this model directory")
+    parser.add_argument("--output", help="JSON file for the results, stdout if omitted")
+    args = parser.parse_args(argv)
+
+    results = []
+    if args.artifacts:
+        transform = FeatureTransform.load(os.path.join(args.artifacts, "transform.npz"))
+        forest = CompiledForest.load(os.path.join(args.artifacts, "forest"))
+        label = {"kind": "artifacts", "trees": forest.num_trees}
+        results += benchStages(label, transform, forest, args.batches, args.repeats)
+    else:
+        records = syntheticProfiles(args.train_rows, seed=SEED + 1)
+        for kind in args.kinds:
+            for trees in args.trees:
+                data_pipe, clf = fitModel(kind, trees, records)
+                transform = compileTransform(data_pipe)
+                forest = compileForest(clf, transform.n_features)
+                if not matchesModel(forest, clf, data_pipe.transform(records[:256])):
+                    raise SystemExit(f"Compiled {kind} forest of {trees} trees does not "
+                                     "match the pysurvival predictions")
+                label = {"kind": kind, "trees": trees}
+                results += benchStages(label, transform, forest, args.batches, args.repeats,
+                                       data_pipe=data_pipe, model=clf)
+
+    report = {"created_at": datetime.now(timezone.utc).isoformat(),
+              "python": platform.python_version(),
+              "numpy": np.__version__,
+              "machine": platform.machine(),
+              "cpu_count": os.cpu_count(),
+              "seed": SEED,
+              "repeats": args.repeats,
+              "results": results}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
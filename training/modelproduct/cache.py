@@ -0,0 +1,54 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class PredictionCache:
+    """
+    LRU cache of prediction results with a size bound and a per entry TTL.
+
+    Keys are built from the model version and the canonical field values of a
+    Details payload, so resubmitted profiles skip both transform and inference.
+    Only used from the event loop, hence no locking
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self.entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(version: str, details) -> Hashable:
+        return (version, tuple(getattr(details, field) for field in details.__fields__))
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self.entries[key] = (value, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl}
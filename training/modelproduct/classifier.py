@@ -1,2 +1,173 @@
-model = None
-pipeline = None
+import hashlib
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from engine import CompiledForest, compileForest, probeRows, matchesModel
+from features import FeatureTransform, compileTransform
+
+
+class Prediction(NamedTuple):
+    hazard: np.ndarray
+    survival: np.ndarray
+    risk: np.ndarray
+    version: str
+    # (stage, seconds) of the transform and every predict call that produced it
+    timings: tuple = ()
+
+    def row(self, i: int) -> "Prediction":
+        """Row i as a Prediction of its own, copied so it does not keep the batch alive"""
+        return Prediction(np.array(self.hazard[i:i + 1], copy=True),
+                          np.array(self.survival[i:i + 1], copy=True),
+                          np.array(np.ravel(self.risk)[i:i + 1], copy=True), self.version)
+
+
+class LoadedModel:
+    """
+    A feature transform and forest loaded from one set of artifacts.
+
+    Requests resolve the served model once and keep using it, so swapping
+    classifier.current for a new LoadedModel never affects predictions in flight
+    """
+
+    def __init__(self, transform: FeatureTransform, forest: Optional[CompiledForest],
+                 model, times: list, version: str):
+        self.transform = transform
+        self.forest = forest
+        self.model = model
+        self.times = times
+        self.version = version
+
+    def predictRows(self, rows) -> Prediction:
+        """Returns the hazard, survival and risk for a list of Details"""
+        timings = []
+        started = time.perf_counter()
+        X = self.transform.transform(rows)
+        timings.append(("transform", time.perf_counter() - started))
+        if self.forest:
+            started = time.perf_counter()
+            hazard, survival, risk = self.forest.predict(X)
+            timings.append(("forest", time.perf_counter() - started))
+        else:
+            # predict walks the forest for the hazard and the survival together, where
+            # predict_hazard and predict_survival would each walk it for both
+            started = time.perf_counter()
+            hazard, _, survival = self.model.predict(X)
+            timings.append(("predict", time.perf_counter() - started))
+            started = time.perf_counter()
+            risk = self.model.predict_risk(X)
+            timings.append(("predict_risk", time.perf_counter() - started))
+        return Prediction(hazard, survival, risk, self.version, tuple(timings))
+
+
+current: Optional[LoadedModel] = None
+
+
+def artifactVersion(*paths: Path) -> str:
+    """Content hash of the artifacts (files or directories) a model was loaded from"""
+    digest = hashlib.sha256()
+    files = []
+    for path in paths:
+        files.extend(sorted(path.glob('*.npy')) if path.is_dir() else [path])
+    for path in files:
+        with open(path, 'rb') as artifact:
+            for block in iter(lambda: artifact.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def loadArtifacts(model_dir: str = None) -> LoadedModel:
+    """Loads the feature transform and the forest from the model artifacts"""
+    model_dir = Path(model_dir or settings.MODEL_DIR)
+
+    if (model_dir / 'transform.npz').exists():
+        transform_path = model_dir / 'transform.npz'
+        transform = FeatureTransform.load(transform_path)
+    else:
+        import joblib
+        transform_path = model_dir / 'data_pipe.sav'
+        transform = compileTransform(joblib.load(transform_path))
+
+    # The exported forest was checked against pysurvival at build time, so the
+    # pysurvival model is only loaded when there is no compiled forest to serve from
+    if (model_dir / 'forest').is_dir():
+        forest, version = reduceCurves(
+            CompiledForest.load(model_dir / 'forest',
+                                mmap_mode='r' if settings.MODEL_MMAP else None),
+            artifactVersion(transform_path, model_dir / 'forest'))
+        return LoadedModel(transform, forest, None, forest.times.tolist(), version)
+
+    from pysurvival.utils import load_model
+    version = artifactVersion(transform_path, model_dir / 'model.zip')
+    model = load_model(str(model_dir / 'model.zip'))
+    n_features = transform.n_features
+    try:
+        forest = compileForest(model, n_features)
+    except (AttributeError, IndexError, TypeError, ValueError):
+        forest = None
+    if forest and not matchesModel(forest, model, probeRows(n_features)):
+        print("Compiled forest does not match the model outputs, using pysurvival predict")
+        forest = None
+    if forest:
+        forest, version = reduceCurves(forest, version)
+        return LoadedModel(transform, forest, model, forest.times.tolist(), version)
+    if settings.CURVE_DTYPE or settings.CURVE_MAX_HORIZON:
+        print("CURVE_DTYPE and CURVE_MAX_HORIZON are ignored by pysurvival predict, "
+              "serving the full float64 curves")
+    return LoadedModel(transform, None, model, list(model.times), version)
+
+
+def reduceCurves(forest: CompiledForest, version: str) -> Tuple[CompiledForest, str]:
+    """
+    Applies CURVE_DTYPE and CURVE_MAX_HORIZON to the curves of a compiled forest. A
+    reduced forest serves another grid and other curves than its artifacts, so its
+    version also names the curve dtype and the last time it keeps
+    """
+    if not (settings.CURVE_DTYPE or settings.CURVE_MAX_HORIZON):
+        return forest, version
+    reduced = forest.reduce(dtype=settings.CURVE_DTYPE or None,
+                            max_horizon=settings.CURVE_MAX_HORIZON or None)
+    if reduced.leaf_chf.dtype == forest.leaf_chf.dtype and \
+            len(reduced.times) == len(forest.times):
+        return forest, version
+    horizon = float(reduced.times[-1]) if len(reduced.times) else 0.
+    return reduced, f"{version}-{reduced.leaf_chf.dtype.name}-h{horizon:g}"
+
+
+def syntheticRows(transform: FeatureTransform, rows: int = 8) -> list:
+    """Profile like rows covering every category of the transform, used for warm up"""
+    fields = {field: np.random.default_rng(42).uniform(0, 100, rows)
+              for field, _ in transform.numeric}
+    synthetic = []
+    for i in range(rows):
+        row = {field: float(values[i]) for field, values in fields.items()}
+        for field, mapping in transform.categorical.items():
+            categories = sorted(mapping)
+            row[field] = categories[i % len(categories)]
+        synthetic.append(SimpleNamespace(**row))
+    return synthetic
+
+
+def warm(loaded: LoadedModel) -> None:
+    """Runs synthetic predictions so lazy allocations happen before real traffic"""
+    loaded.predictRows(syntheticRows(loaded.transform)[:1])
+    loaded.predictRows(syntheticRows(loaded.transform))
+
+
+def load(model_dir: str = None) -> LoadedModel:
+    global current
+    current = loadArtifacts(model_dir)
+    return current
+
+
+def isLoaded() -> bool:
+    return current is not None
+
+
+def predictRows(rows) -> Prediction:
+    """Returns the hazard, survival and risk for a list of Details"""
+    return current.predictRows(rows)
@@ -0,0 +1,47 @@
+import os
+
+from pydantic import BaseSettings, validator
+
+from engine import CURVE_DTYPES
+
+
+class Settings(BaseSettings):
+    PROJECT_NAME: str = "Finlytik ML API"
+    MODEL_DIR: str = "."
+    # Memory map the compiled forest so every worker process shares its pages
+    MODEL_MMAP: bool = True
+
+    # Output curves: "float64" or "float32" ("" keeps the exported precision) and the
+    # last time kept (0 keeps all). Prefer baking these into the exported forest,
+    # reducing at load copies it out of the shared memory map
+    CURVE_DTYPE: str = ""
+    CURVE_MAX_HORIZON: float = 0.0
+
+    @validator("CURVE_DTYPE")
+    def checkCurveDtype(cls, v: str) -> str:
+        if v and v not in CURVE_DTYPES:
+            raise ValueError(f"must be one of {', '.join(CURVE_DTYPES)} or empty")
+        return v
+
+    # Where CPU bound inference runs: "thread", "process" or "inline" (on the event loop)
+    INFERENCE_EXECUTOR: str = "thread"
+    INFERENCE_WORKERS: int = os.cpu_count() or 1
+
+    # Coalesce single /predict calls into batches of up to BATCH_MAX_SIZE rows,
+    # waiting at most BATCH_MAX_WAIT_MS for a batch to fill
+    BATCHING_ENABLED: bool = False
+    BATCH_MAX_SIZE: int = 64
+    BATCH_MAX_WAIT_MS: float = 5.0
+
+    # Results of repeated profiles, CACHE_MAX_SIZE = 0 disables the cache
+    CACHE_MAX_SIZE: int = 4096
+    CACHE_TTL_SECONDS: float = 3600.0
+
+    # Hot reload: POST /v1/finlytik/model/reload needs the X-Admin-Token header to
+    # match ADMIN_TOKEN and only loads from MODEL_DIR or a directory under it.
+    # MODEL_WATCH_SECONDS > 0 polls MODEL_DIR for new artifacts
+    ADMIN_TOKEN: str = ""
+    MODEL_WATCH_SECONDS: float = 0.0
+
+
+settings = Settings()
@@ -0,0 +1,216 @@
+import os
+from pathlib import Path
+
+import numpy as np
+
+# Node arrays of all the trees are concatenated; leaves point back to themselves so that
+# every row can be pushed down every tree for a fixed number of steps without masking.
+ARRAYS = ("times", "roots", "feature", "threshold", "left", "right",
+          "leaf_slot", "leaf_chf", "leaf_survival", "leaf_risk")
+
+# Curve precisions the responses can be serialized in
+CURVE_DTYPES = ("float32", "float64")
+
+
+def featureColumns(model, n_features: int) -> np.ndarray:
+    """
+    Maps the ranger variable ids used by the forest splits onto the columns of the
+    transformed feature matrix. The forest is trained on the features plus the time
+    and event columns, so the dependent variables are skipped when counting
+    """
+    names = list(model.variable_names)
+    if len(names) == n_features:
+        return np.arange(n_features)
+    dependent = {model.dependent_varID, model.status_varID}
+    columns = np.full(len(names), -1, dtype=np.int64)
+    col = 0
+    for var_id in range(len(names)):
+        if var_id in dependent:
+            continue
+        columns[var_id] = col
+        col += 1
+    return columns
+
+
+class CompiledForest:
+    """
+    Array backed survival forest.
+
+    The forest is held as flat NumPy arrays (split feature, threshold, children and
+    per leaf cumulative hazard/survival curves) and a whole batch is pushed down all
+    the trees at once. Hazard, survival and risk are derived from the same leaf
+    lookups, so the forest is only traversed once per prediction.
+
+    The risk of a leaf is the sum of its cumulative hazard over the full times grid
+    of the fitted model and is kept separately, so it is unchanged when the curves
+    are reduced to a coarser grid, a shorter horizon or float32
+    """
+
+    def __init__(self, times, roots, feature, threshold, left, right,
+                 leaf_slot, leaf_chf, leaf_survival, leaf_risk, depth: int):
+        self.times = times
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_slot = leaf_slot
+        self.leaf_chf = leaf_chf
+        self.leaf_survival = leaf_survival
+        self.leaf_risk = leaf_risk
+        self.depth = int(depth)
+
+    @property
+    def num_trees(self) -> int:
+        return len(self.roots)
+
+    def leaves(self, X) -> np.ndarray:
+        """Returns the leaf slot reached by every row of X in every tree (rows x trees)"""
+        X = np.asarray(X, dtype=np.float64)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.num_trees)).copy()
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.leaf_slot[node]
+
+    def predict(self, X, chunk_size: int = 2 ** 21):
+        """Returns the hazard, survival and risk of every row of X"""
+        slots = self.leaves(X)
+        n_rows, n_times = slots.shape[0], len(self.times)
+        chf = np.empty((n_rows, n_times), dtype=self.leaf_chf.dtype)
+        survival = np.empty((n_rows, n_times), dtype=self.leaf_survival.dtype)
+
+        # Bound the (rows x trees x times) gather to chunk_size values at a time
+        step = max(1, chunk_size // max(1, self.num_trees * n_times))
+        for start in range(0, n_rows, step):
+            block = slots[start:start + step]
+            chf[start:start + step] = self.leaf_chf[block].mean(axis=1)
+            survival[start:start + step] = self.leaf_survival[block].mean(axis=1)
+
+        hazard = np.diff(chf, axis=1, prepend=chf.dtype.type(0))
+        risk = self.leaf_risk[slots].mean(axis=1)
+        return hazard, survival, risk
+
+    def reduce(self, dtype=None, max_horizon: float = None, grid=None) -> "CompiledForest":
+        """
+        Returns a forest whose curves are resampled onto grid (step function of the
+        cumulative hazard), cut at max_horizon and/or stored as dtype. Fewer and
+        smaller values make predictions, responses and stored profiles cheaper
+        """
+        if dtype is not None and np.dtype(dtype).name not in CURVE_DTYPES:
+            raise ValueError(f"Curves can only be stored as {' or '.join(CURVE_DTYPES)}")
+        times = np.asarray(self.times, dtype=np.float64)
+        chf = np.asarray(self.leaf_chf)
+        if grid is not None:
+            grid = np.asarray(grid, dtype=np.float64)
+            index = np.searchsorted(times, grid, side="right") - 1
+            chf = np.where(index >= 0, chf[:, np.maximum(index, 0)], 0.)
+            times = grid
+        if max_horizon is not None:
+            keep = times <= max_horizon
+            times, chf = times[keep], chf[:, keep]
+        chf = np.ascontiguousarray(chf, dtype=dtype or chf.dtype)
+        return CompiledForest(times=times, roots=self.roots, feature=self.feature,
+                              threshold=self.threshold, left=self.left, right=self.right,
+                              leaf_slot=self.leaf_slot, leaf_chf=chf,
+                              leaf_survival=np.exp(-chf), leaf_risk=self.leaf_risk,
+                              depth=self.depth)
+
+    def save(self, path: str) -> None:
+        """
+        Saves the forest as a directory of .npy files, one per array, so it can be
+        memory mapped. Each file is replaced atomically, which keeps the pages of a
+        forest already mapped by a running service intact
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        arrays = {name: getattr(self, name) for name in ARRAYS}
+        arrays["depth"] = np.asarray([self.depth])
+        for name, array in arrays.items():
+            tmp = path / f".{name}.npy.tmp"
+            with open(tmp, "wb") as file:
+                np.save(file, np.ascontiguousarray(array))
+            os.replace(tmp, path / f"{name}.npy")
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = None) -> "CompiledForest":
+        """
+        Loads a saved forest, with mmap_mode='r' the arrays stay in the page cache and
+        are shared by every process serving the same files
+        """
+        path = Path(path)
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+                  for name in ARRAYS if (path / f"{name}.npy").exists()}
+        if "leaf_risk" not in arrays:
+            arrays["leaf_risk"] = np.asarray(arrays["leaf_chf"]).sum(axis=1)
+        return cls(depth=int(np.load(path / "depth.npy")[0]), **arrays)
+
+
+def compileForest(model, n_features: int) -> CompiledForest:
+    """
+    Flattens the trees of a fitted pysurvival RandomSurvivalForestModel or
+    ConditionalSurvivalForestModel into a CompiledForest
+    """
+    columns = featureColumns(model, n_features)
+    times = np.asarray(model.times, dtype=np.float64)
+    roots, feature, threshold, left, right, leaf_slot = [], [], [], [], [], []
+    leaf_chf = []
+    depth = 0
+    offset = 0
+    for tree in range(model.num_trees):
+        tree_left, tree_right = model.child_nodeIDs[tree]
+        split_var = model.split_varIDs[tree]
+        split_value = model.split_values[tree]
+        chf = model.chf[tree]
+        roots.append(offset)
+
+        node_depth = {0: 0}
+        for node in range(len(tree_left)):
+            is_leaf = tree_left[node] == 0 and tree_right[node] == 0
+            if is_leaf:
+                feature.append(0)
+                threshold.append(0.)
+                left.append(offset + node)
+                right.append(offset + node)
+                leaf_slot.append(len(leaf_chf))
+                leaf_chf.append(np.asarray(chf[node], dtype=np.float64))
+            else:
+                feature.append(columns[split_var[node]])
+                threshold.append(split_value[node])
+                left.append(offset + tree_left[node])
+                right.append(offset + tree_right[node])
+                leaf_slot.append(-1)
+                node_depth[tree_left[node]] = node_depth[node] + 1
+                node_depth[tree_right[node]] = node_depth[node] + 1
+        depth = max(depth, max(node_depth.values()))
+        offset += len(tree_left)
+
+    leaf_chf = np.vstack(leaf_chf)
+    return CompiledForest(times=times,
+                          roots=np.asarray(roots, dtype=np.int32),
+                          feature=np.asarray(feature, dtype=np.int32),
+                          threshold=np.asarray(threshold, dtype=np.float64),
+                          left=np.asarray(left, dtype=np.int32),
+                          right=np.asarray(right, dtype=np.int32),
+                          leaf_slot=np.asarray(leaf_slot, dtype=np.int32),
+                          leaf_chf=leaf_chf,
+                          leaf_survival=np.exp(-leaf_chf),
+                          leaf_risk=leaf_chf.sum(axis=1),
+                          depth=depth)
+
+
+def probeRows(n_features: int, rows: int = 8) -> np.ndarray:
+    """Synthetic rows in the standardised feature space used to check and warm models"""
+    return np.random.default_rng(42).normal(size=(rows, n_features))
+
+
+def matchesModel(forest: CompiledForest, model, X, rtol: float = 1e-6) -> bool:
+    """Checks the compiled forest outputs against the pysurvival predict calls on X"""
+    try:
+        hazard, survival, risk = forest.predict(X)
+    except Exception:
+        return False
+    return (np.allclose(hazard, model.predict_hazard(X), rtol=rtol)
+            and np.allclose(survival, model.predict_survival(X), rtol=rtol)
+            and np.allclose(risk, np.asarray(model.predict_risk(X)).flatten(), rtol=rtol))
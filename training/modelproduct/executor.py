@@ -0,0 +1,74 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+import classifier
+import metrics
+from config import settings
+
+executor: Optional[Executor] = None
+
+
+def _initWorker(model_dir: Optional[str]):
+    # Forked workers inherit the parent's model, spawned ones load their own copy
+    if not classifier.isLoaded():
+        classifier.load(model_dir)
+
+
+def _warmWorker():
+    classifier.warm(classifier.current)
+
+
+def start(model_dir: str = None):
+    """Creates the pool configured by INFERENCE_EXECUTOR"""
+    global executor
+    kind = settings.INFERENCE_EXECUTOR
+    if kind == "process":
+        executor = ProcessPoolExecutor(max_workers=settings.INFERENCE_WORKERS,
+                                       initializer=_initWorker, initargs=(model_dir,))
+    elif kind == "thread":
+        executor = ThreadPoolExecutor(max_workers=settings.INFERENCE_WORKERS,
+                                      thread_name_prefix="inference")
+    elif kind == "inline":
+        executor = None
+    else:
+        raise ValueError(f"Unknown INFERENCE_EXECUTOR: {kind}")
+
+
+def restart(model_dir: str = None):
+    """
+    Replaces a process pool so its workers pick up the swapped in model, the old pool
+    finishes the work already submitted to it. Threads read the new model directly
+    """
+    if not isinstance(executor, ProcessPoolExecutor):
+        return
+    old = executor
+    start(model_dir)
+    old.shutdown(wait=False)
+
+
+async def warmWorkers():
+    """Runs a synthetic prediction on every worker so none of them starts cold"""
+    if executor is None:
+        return
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*[loop.run_in_executor(executor, _warmWorker)
+                           for _ in range(settings.INFERENCE_WORKERS)])
+
+
+def shutdown():
+    global executor
+    if executor:
+        executor.shutdown(wait=True)
+    executor = None
+
+
+async def predictRows(rows):
+    """Runs classifier.predictRows on the pool so the event loop keeps serving requests"""
+    if executor is None:
+        prediction = classifier.predictRows(rows)
+    else:
+        loop = asyncio.get_running_loop()
+        prediction = await loop.run_in_executor(executor, classifier.predictRows, rows)
+    metrics.observePrediction(prediction, len(rows))
+    return prediction
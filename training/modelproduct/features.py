@@ -0,0 +1,71 @@
+import numpy as np
+
+SEPARATOR = "="
+
+
+class FeatureTransform:
+    """
+    Precompiled replacement for the DictVectorizer -> MinMaxScaler -> StandardScaler
+    pipeline.
+
+    Column order is fixed at export time, categorical values map straight to their one
+    hot column and both scalers are folded into a single affine transform
+    (scale * x + offset), so rows are written from the request models into one array
+    without building dicts or calling sklearn
+    """
+
+    def __init__(self, columns, scale, offset):
+        self.columns = [str(column) for column in columns]
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.offset = np.asarray(offset, dtype=np.float64)
+
+        self.numeric = []
+        self.categorical = {}
+        for col, column in enumerate(self.columns):
+            if SEPARATOR in column:
+                field, value = column.split(SEPARATOR, 1)
+                self.categorical.setdefault(field, {})[value] = col
+            else:
+                self.numeric.append((column, col))
+        self._numeric_cols = np.asarray([col for _, col in self.numeric], dtype=np.int64)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.columns)
+
+    def transform(self, rows) -> np.ndarray:
+        """Returns the scaled feature matrix for objects exposing the profile fields"""
+        X = np.empty((len(rows), self.n_features))
+        X[:] = self.offset
+        cols = self._numeric_cols
+        values = np.array([[getattr(row, field) for field, _ in self.numeric] for row in rows],
+                          dtype=np.float64).reshape(len(rows), len(cols))
+        X[:, cols] += values * self.scale[cols]
+        for field, mapping in self.categorical.items():
+            for i, row in enumerate(rows):
+                col = mapping.get(getattr(row, field))
+                if col is not None:
+                    X[i, col] += self.scale[col]
+        return X
+
+    def save(self, path: str) -> None:
+        np.savez(path, columns=np.asarray(self.columns), scale=self.scale, offset=self.offset)
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureTransform":
+        with np.load(path) as data:
+            return cls(data["columns"], data["scale"], data["offset"])
+
+
+def compileTransform(pipeline) -> FeatureTransform:
+    """Folds a fitted dv/minmax/std pipeline into a FeatureTransform"""
+    dv = pipeline.named_steps['dv']
+    minmax = pipeline.named_steps['minmax']
+    std = pipeline.named_steps['std']
+
+    # std((x * minmax.scale_ + minmax.min_)) = x * scale + offset
+    mean = std.mean_ if std.mean_ is not None else 0.
+    std_scale = std.scale_ if std.scale_ is not None else 1.
+    scale = minmax.scale_ / std_scale
+    offset = (minmax.min_ - mean) / std_scale
+    return FeatureTransform(dv.feature_names_, scale, offset)
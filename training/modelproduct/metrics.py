@@ -0,0 +1,60 @@
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+
+STAGE_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1., 2.5)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+REQUESTS = Counter('finlytik_requests_total', 'Prediction requests served',
+                   ['endpoint', 'status', 'model_version'])
+IN_FLIGHT = Gauge('finlytik_requests_in_flight', 'Prediction requests being served')
+STAGE_SECONDS = Histogram('finlytik_stage_seconds', 'Time spent in each prediction stage',
+                          ['stage', 'model_version'], buckets=STAGE_BUCKETS)
+BATCH_SIZE = Histogram('finlytik_batch_rows', 'Rows scored per forest evaluation',
+                       ['model_version'], buckets=BATCH_BUCKETS)
+MODEL_INFO = Gauge('finlytik_model_info', 'Model version being served', ['model_version'])
+
+
+def observeStage(stage: str, seconds: float, version: str) -> None:
+    STAGE_SECONDS.labels(stage, version or "").observe(seconds)
+
+
+def observePrediction(prediction, rows: int) -> None:
+    """Records the batch size and the transform/predict timings of a Prediction"""
+    BATCH_SIZE.labels(prediction.version).observe(rows)
+    for stage, seconds in prediction.timings:
+        observeStage(stage, seconds, prediction.version)
+
+
+def observeValidation(request, version: str) -> None:
+    """Time from the request reaching the service until its body was validated"""
+    started = getattr(request.state, "started", None)
+    if started is not None:
+        observeStage("validation", time.perf_counter() - started, version)
+
+
+def setModel(version: str) -> None:
+    MODEL_INFO.clear()
+    MODEL_INFO.labels(version).set(1)
+
+
+class CacheCollector:
+    """Exposes the hit and miss counters the PredictionCache keeps itself"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def collect(self):
+        stats = self.cache.stats()
+        requests = CounterMetricFamily('finlytik_cache_requests', 'Prediction cache lookups',
+                                       labels=['result'])
+        requests.add_metric(['hit'], stats['hits'])
+        requests.add_metric(['miss'], stats['misses'])
+        yield requests
+        yield GaugeMetricFamily('finlytik_cache_entries', 'Prediction cache entries',
+                                value=stats['size'])
+
+
+def registerCache(cache) -> None:
+    REGISTRY.register(CacheCollector(cache))
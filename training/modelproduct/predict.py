@@ -1,8 +1,21 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel
-from typing import Any
-from pysurvival.utils import load_model
-import joblib
+from pathlib import Path
+from typing import Any, List, Optional
+import asyncio
+import hmac
+import time
+import numpy as np
+import classifier
+import executor
+import metrics
+import reloader
+from batching import MicroBatcher
+from cache import PredictionCache
+from classifier import Prediction
+from config import settings
+from serialize import CurveEncoding, encodeCurve, encodeCurves
 
 
 class Details(BaseModel):
@@ -28,27 +41,239 @@ class Details(BaseModel):
 
 
 predict = APIRouter()
-model = None
-pipeline = None
+batcher = None
+cache = None
+
+# Set once the model is loaded and warm; failed is set if that never happens
+ready = False
+failed = False
+preparing = None
+
+
+async def prepareModel():
+    """
+    Loads the model off the event loop, warms it and the inference workers with
+    synthetic predictions and only then reports the service as ready
+    """
+    global ready
+    global failed
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        loaded = await loop.run_in_executor(None, classifier.load)
+        loaded_at = time.perf_counter()
+        await loop.run_in_executor(None, classifier.warm, loaded)
+        executor.start()
+        await executor.warmWorkers()
+    except Exception as err:
+        failed = True
+        print(f"Model could not be loaded: {err}")
+        raise
+    metrics.setModel(loaded.version)
+    ready = True
+    print(f"Model {loaded.version} loaded in {loaded_at - started:.2f}s, "
+          f"warmed in {time.perf_counter() - loaded_at:.2f}s")
+
+
+def requireReady():
+    if not ready:
+        raise HTTPException(status_code=503, detail="Model is loading")
 
 
 @predict.on_event('startup')
 async def loadModel():
-    global pipeline
-    global model
-    pipeline = joblib.load('./data_pipe.sav')
-    model = load_model('./model.zip')
+    global batcher
+    global cache
+    global preparing
+    preparing = asyncio.get_running_loop().create_task(prepareModel())
+    if settings.CACHE_MAX_SIZE > 0:
+        cache = PredictionCache(settings.CACHE_MAX_SIZE, settings.CACHE_TTL_SECONDS)
+        metrics.registerCache(cache)
+    if settings.BATCHING_ENABLED:
+        batcher = MicroBatcher(settings.BATCH_MAX_SIZE, settings.BATCH_MAX_WAIT_MS,
+                               max_inflight=settings.INFERENCE_WORKERS)
+        batcher.start()
+    reloader.onSwap.append(lambda loaded: cache.clear() if cache else None)
+    reloader.onSwap.append(lambda loaded: metrics.setModel(loaded.version))
+    if settings.MODEL_WATCH_SECONDS > 0:
+        reloader.startWatching()
+
+
+@predict.on_event('shutdown')
+async def stopExecutor():
+    if preparing and not preparing.done():
+        preparing.cancel()
+    await reloader.stopWatching()
+    if batcher:
+        await batcher.stop()
+    executor.shutdown()
 
 
 @predict.post('/finlytik/predict',
               tags=["predictions"],
-              description="Credit Risk Prediction")
-async def getPrediction(details: Details):
-    X = pipeline.transform([details.dict()])
-    hazard = model.predict_hazard(X)
-    survival = model.predict_survival(X)
-    risk = model.predict_risk(X)
-    return {"times": list(model.times),
-            "hazard": list(hazard.flatten()),
-            "risk": list(risk.flatten()),
-            "survival": list(survival.flatten())}
+              description="Credit Risk Prediction",
+              dependencies=[Depends(requireReady)])
+async def getPrediction(request: Request, details: Details,
+                        encoding: CurveEncoding = CurveEncoding.json):
+    """
+    The times grid of the curves is served by /finlytik/model/{model_version}. With
+    encoding=f32 the curves are base64 little endian float32
+    """
+    metrics.observeValidation(request, classifier.current.version)
+    key = PredictionCache.key(classifier.current.version, details)
+    result = cache.get(key) if cache else None
+    if result is None:
+        if batcher:
+            result = await batcher.submit(details)
+        else:
+            result = await executor.predictRows([details])
+        if cache:
+            cache.put(PredictionCache.key(result.version, details), result)
+    return respond(result.version, {"model_version": result.version,
+                                    "encoding": encoding,
+                                    "hazard": encodeCurve(result.hazard.flatten(), encoding),
+                                    "risk": np.ravel(result.risk).astype(np.float64),
+                                    "survival": encodeCurve(result.survival.flatten(), encoding)})
+
+
+@predict.post('/finlytik/predict/batch',
+              tags=["predictions"],
+              description="Credit Risk Prediction for a batch of profiles",
+              dependencies=[Depends(requireReady)])
+async def getBatchPrediction(request: Request, details: List[Details],
+                             encoding: CurveEncoding = CurveEncoding.json):
+    """
+    Scores many profiles in one call: the batch is transformed as a single matrix
+    and the forest is evaluated once over all of its rows. Row i of hazard, risk and
+    survival belongs to the i-th profile of the request.
+    """
+    metrics.observeValidation(request, classifier.current.version)
+    if not details:
+        return ORJSONResponse({"model_version": classifier.current.version, "encoding": encoding,
+                               "hazard": [], "risk": [], "survival": []})
+    if not cache:
+        result = await executor.predictRows(details)
+    else:
+        result = await cachedBatch(details)
+    return respond(result.version, {"model_version": result.version,
+                                    "encoding": encoding,
+                                    "hazard": encodeCurves(result.hazard, encoding),
+                                    "risk": np.ravel(result.risk).astype(np.float64),
+                                    "survival": encodeCurves(result.survival, encoding)})
+
+
+def respond(version: str, content: dict) -> ORJSONResponse:
+    """Renders a prediction response, timed as the serialization stage"""
+    started = time.perf_counter()
+    response = ORJSONResponse(content)
+    metrics.observeStage("serialization", time.perf_counter() - started, version)
+    return response
+
+
+async def cachedBatch(details: List[Details]) -> Prediction:
+    """Scores only the profiles of a batch that are not cached and merges the results"""
+    version = classifier.current.version
+    keys = [PredictionCache.key(version, detail) for detail in details]
+    results = [cache.get(key) for key in keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        scored = await executor.predictRows([details[i] for i in missing])
+        if scored.version != version or len(missing) == len(details):
+            # Either nothing was cached or the model was swapped while scoring
+            if len(missing) != len(details):
+                scored = await executor.predictRows(details)
+                missing = list(range(len(details)))
+            for i in missing:
+                cache.put(PredictionCache.key(scored.version, details[i]), scored.row(i))
+            return scored
+        for j, i in enumerate(missing):
+            results[i] = scored.row(j)
+            cache.put(keys[i], results[i])
+    return Prediction(np.concatenate([result.hazard for result in results]),
+                      np.concatenate([result.survival for result in results]),
+                      np.concatenate([np.ravel(result.risk) for result in results]),
+                      version)
+
+
+@predict.get('/finlytik/model',
+             tags=["model"],
+             description="Version and times grid of the served model",
+             dependencies=[Depends(requireReady)])
+async def getModel(if_none_match: Optional[str] = Header(None)):
+    # The model can be swapped at any time, so clients revalidate with the ETag and
+    # cache the grid under /finlytik/model/{version} instead
+    loaded = classifier.current
+    etag = f'"{loaded.version}"'
+    headers = {"Cache-Control": "no-cache", "ETag": etag}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse({"model_version": loaded.version, "times": loaded.times},
+                          headers=headers)
+
+
+@predict.get('/finlytik/model/{version}',
+             tags=["model"],
+             description="Times grid of a model version, 404 once it is no longer served",
+             dependencies=[Depends(requireReady)])
+async def getModelVersion(version: str):
+    # The grid of a version never changes
+    loaded = classifier.current
+    if version != loaded.version:
+        raise HTTPException(status_code=404, detail=f"Model {version} is not served")
+    return ORJSONResponse({"model_version": loaded.version, "times": loaded.times},
+                          headers={"Cache-Control": "public, max-age=86400, immutable",
+                                   "ETag": f'"{loaded.version}"'})
+
+
+def modelPath(model_dir: str) -> str:
+    """model_dir resolved under MODEL_DIR, artifacts are never loaded from elsewhere"""
+    root = Path(settings.MODEL_DIR).resolve()
+    path = (root / model_dir).resolve()
+    if path != root and root not in path.parents:
+        raise HTTPException(status_code=400, detail=f"model_dir must be under {root}")
+    return str(path)
+
+
+@predict.post('/finlytik/model/reload',
+              tags=["model"],
+              description="Load, warm up and swap in the model artifacts",
+              dependencies=[Depends(requireReady)])
+async def postModelReload(model_dir: Optional[str] = None,
+                          x_admin_token: Optional[str] = Header(None)):
+    if not settings.ADMIN_TOKEN or not hmac.compare_digest(
+            (x_admin_token or "").encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Not allowed to reload the model")
+    if model_dir is not None:
+        model_dir = modelPath(model_dir)
+    try:
+        loaded = await reloader.reloadModel(model_dir)
+    except Exception as err:
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {err}")
+    return {"model_version": loaded.version}
+
+
+@predict.get('/finlytik/cache',
+             tags=["monitoring"],
+             description="Prediction cache hit and miss counters")
+async def getCacheStats():
+    if not cache:
+        return {"enabled": False}
+    return {"enabled": True, "model_version": classifier.current and classifier.current.version,
+            **cache.stats()}
+
+
+@predict.get('/finlytik/health/live',
+             tags=["health"],
+             description="Liveness: fails only if the model could not be loaded")
+async def getLive():
+    if failed:
+        raise HTTPException(status_code=500, detail="Model could not be loaded")
+    return {"status": "alive"}
+
+
+@predict.get('/finlytik/health/ready',
+             tags=["health"],
+             description="Readiness: succeeds once the model is loaded and warm")
+async def getReady():
+    requireReady()
+    return {"status": "ready", "model_version": classifier.current.version}
@@ -0,0 +1,86 @@
+import asyncio
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import classifier
+import executor
+from config import settings
+
+ARTIFACTS = ('transform.npz', 'data_pipe.sav', 'forest', 'model.zip')
+
+# Called with the new LoadedModel right after it is swapped in
+onSwap: List[Callable] = []
+
+_lock: Optional[asyncio.Lock] = None
+_watcher: Optional[asyncio.Task] = None
+
+
+def _prepare(model_dir: Optional[str]) -> classifier.LoadedModel:
+    loaded = classifier.loadArtifacts(model_dir)
+    classifier.warm(loaded)
+    return loaded
+
+
+async def reloadModel(model_dir: str = None) -> classifier.LoadedModel:
+    """
+    Loads and warms the artifacts of model_dir off the event loop, then swaps them in.
+    Requests already running keep the model they started with; process workers are
+    replaced by a new pool while the old one finishes its queued work
+    """
+    global _lock
+    if _lock is None:
+        _lock = asyncio.Lock()
+    async with _lock:
+        loop = asyncio.get_running_loop()
+        loaded = await loop.run_in_executor(None, _prepare, model_dir)
+        classifier.current = loaded
+        executor.restart(model_dir)
+        await executor.warmWorkers()
+        for callback in onSwap:
+            callback(loaded)
+        print(f"Serving model version {loaded.version}")
+        return loaded
+
+
+def artifactSignature(model_dir: str) -> tuple:
+    signature = []
+    for name in ARTIFACTS:
+        path = Path(model_dir) / name
+        for artifact in (sorted(path.glob('*.npy')) if path.is_dir() else [path]):
+            if artifact.exists():
+                stat = artifact.stat()
+                signature.append((str(artifact), stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+async def _watch(model_dir: str, interval: float):
+    served = artifactSignature(model_dir)
+    previous = served
+    while True:
+        await asyncio.sleep(interval)
+        signature = artifactSignature(model_dir)
+        # Only reload once the artifacts have stopped changing between two polls
+        if signature != served and signature == previous:
+            try:
+                await reloadModel(model_dir)
+                served = signature
+            except Exception as err:
+                print(f"Model reload from {model_dir} failed: {err}")
+        previous = signature
+
+
+def startWatching(model_dir: str = None):
+    global _watcher
+    _watcher = asyncio.get_running_loop().create_task(
+        _watch(model_dir or settings.MODEL_DIR, settings.MODEL_WATCH_SECONDS))
+
+
+async def stopWatching():
+    global _watcher
+    if _watcher:
+        _watcher.cancel()
+        try:
+            await _watcher
+        except asyncio.CancelledError:
+            pass
+    _watcher = None
@@ -0,0 +1,25 @@
+import base64
+from enum import Enum
+
+import numpy as np
+
+
+class CurveEncoding(str, Enum):
+    json = "json"
+    f32 = "f32"
+
+
+def encodeCurve(values, encoding: CurveEncoding):
+    """
+    Encodes one curve for a response: a float array in its own precision (serialized
+    by orjson) or base64 of its little endian float32 bytes
+    """
+    if encoding == CurveEncoding.f32:
+        return base64.b64encode(np.ascontiguousarray(values, dtype='<f4').tobytes()).decode()
+    return np.ascontiguousarray(values)
+
+
+def encodeCurves(rows, encoding: CurveEncoding):
+    if encoding == CurveEncoding.f32:
+        return [encodeCurve(row, encoding) for row in rows]
+    return np.ascontiguousarray(rows)
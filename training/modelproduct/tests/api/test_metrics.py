@@ -0,0 +1,33 @@
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import classifier
+from bench import syntheticProfiles
+
+PREDICT = "/v1/finlytik/predict"
+
+
+def requests(endpoint: str, status: int) -> float:
+    return REGISTRY.get_sample_value("finlytik_requests_total", {
+        "endpoint": endpoint, "status": str(status),
+        "model_version": classifier.current.version}) or 0.
+
+
+def testPredictionRoutesAreLabelled(client: TestClient) -> None:
+    served = requests(f"{PREDICT}/batch", 200)
+    client.post(f"{PREDICT}/batch", json=syntheticProfiles(1))
+    assert requests(f"{PREDICT}/batch", 200) == served + 1
+
+
+def testUnknownPathsShareOneLabel(client: TestClient) -> None:
+    other = requests("other", 404)
+    for path in (f"{PREDICT}X", f"{PREDICT}/foo", f"{PREDICT}/batch/foo"):
+        assert client.post(path, json={}).status_code == 404
+        assert requests(path, 404) == 0.
+    assert requests("other", 404) == other + 3
+
+
+def testMetricsAreExposed(client: TestClient) -> None:
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert "finlytik_requests_total" in r.text
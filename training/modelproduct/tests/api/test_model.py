@@ -0,0 +1,75 @@
+from pathlib import Path
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import classifier
+import predict
+from bench import syntheticProfiles
+from config import settings
+from features import compileTransform
+from tests.utils.forest import exportArtifacts
+
+MODEL = "/v1/finlytik/model"
+PREDICT = "/v1/finlytik/predict"
+
+
+def testModelIsRevalidatedWithItsETag(client: TestClient) -> None:
+    r = client.get(MODEL)
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == "no-cache"
+    assert r.headers["etag"] == f'"{classifier.current.version}"'
+    assert r.json() == {"model_version": classifier.current.version,
+                        "times": classifier.current.times}
+
+    r = client.get(MODEL, headers={"If-None-Match": r.headers["etag"]})
+    assert r.status_code == 304
+    assert not r.content
+    assert client.get(MODEL, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def testServedVersionIsImmutable(client: TestClient) -> None:
+    r = client.get(f"{MODEL}/{classifier.current.version}")
+    assert r.status_code == 200
+    assert "immutable" in r.headers["cache-control"]
+    assert r.json()["times"] == classifier.current.times
+
+
+def testOtherVersionIsNotFound(client: TestClient) -> None:
+    assert client.get(f"{MODEL}/000000000000").status_code == 404
+
+
+def reload(client: TestClient, model_dir: str = None, token: str = None):
+    params = {"model_dir": model_dir} if model_dir is not None else {}
+    headers = {"X-Admin-Token": token} if token is not None else {}
+    return client.post(f"{MODEL}/reload", params=params, headers=headers)
+
+
+def testReloadNeedsTheAdminToken(client: TestClient) -> None:
+    assert reload(client).status_code == 403
+    assert reload(client, token="wrong").status_code == 403
+
+
+def testReloadStaysUnderModelDir(client: TestClient) -> None:
+    for model_dir in ("..", "../other", "/tmp"):
+        assert reload(client, model_dir, settings.ADMIN_TOKEN).status_code == 400
+
+
+def testReloadSwapsModelAndClearsCache(client: TestClient, pipeline, model_dir: Path) -> None:
+    exportArtifacts(compileTransform(pipeline), model_dir / "next", seed=1)
+    record = syntheticProfiles(1, seed=3)[0]
+    before = client.post(PREDICT, json=record).json()
+    served = classifier.current.version
+    assert predict.cache.stats()["size"] > 0
+    try:
+        r = reload(client, "next", settings.ADMIN_TOKEN)
+        assert r.status_code == 200
+        version = r.json()["model_version"]
+        assert version != served
+        assert classifier.current.version == version
+        assert predict.cache.stats()["size"] == 0
+        after = client.post(PREDICT, json=record).json()
+        assert after["model_version"] == version
+        assert not np.allclose(after["hazard"], before["hazard"])
+    finally:
+        assert reload(client, token=settings.ADMIN_TOKEN).json()["model_version"] == served
@@ -0,0 +1,85 @@
+import base64
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import classifier
+import predict
+from bench import syntheticProfiles
+from classifier import Prediction
+from predict import Details
+
+PREDICT = "/v1/finlytik/predict"
+
+
+def scored(records: list) -> Prediction:
+    return classifier.current.predictRows([Details(**record) for record in records])
+
+
+def testPredictionMatchesModel(client: TestClient) -> None:
+    record = syntheticProfiles(1, seed=3)[0]
+    r = client.post(PREDICT, json=record)
+    assert r.status_code == 200
+    prediction = r.json()
+    expected = scored([record])
+    assert prediction["model_version"] == classifier.current.version
+    assert np.allclose(prediction["hazard"], expected.hazard[0])
+    assert np.allclose(prediction["survival"], expected.survival[0])
+    assert np.allclose(prediction["risk"], expected.risk)
+
+
+def testBatchPredictionMatchesModel(client: TestClient) -> None:
+    records = syntheticProfiles(5, seed=3)
+    r = client.post(f"{PREDICT}/batch", json=records)
+    assert r.status_code == 200
+    prediction = r.json()
+    expected = scored(records)
+    assert prediction["model_version"] == classifier.current.version
+    assert np.allclose(prediction["hazard"], expected.hazard)
+    assert np.allclose(prediction["survival"], expected.survival)
+    assert np.allclose(prediction["risk"], expected.risk)
+
+
+def testEmptyBatch(client: TestClient) -> None:
+    r = client.post(f"{PREDICT}/batch", json=[])
+    assert r.status_code == 200
+    assert r.json() == {"model_version": classifier.current.version, "encoding": "json",
+                        "hazard": [], "risk": [], "survival": []}
+
+
+def testPartlyCachedBatchKeepsRowOrder(client: TestClient) -> None:
+    records = syntheticProfiles(4, seed=11)
+    client.post(f"{PREDICT}/batch", json=records[1:3])
+    hits, misses = predict.cache.hits, predict.cache.misses
+    r = client.post(f"{PREDICT}/batch", json=records)
+    assert (predict.cache.hits - hits, predict.cache.misses - misses) == (2, 2)
+    prediction = r.json()
+    expected = scored(records)
+    assert np.allclose(prediction["hazard"], expected.hazard)
+    assert np.allclose(prediction["survival"], expected.survival)
+    assert np.allclose(prediction["risk"], expected.risk)
+
+
+def testInvalidProfileIsRejected(client: TestClient) -> None:
+    record = syntheticProfiles(1, seed=3)[0]
+    del record["age"]
+    assert client.post(f"{PREDICT}/batch", json=[record]).status_code == 422
+
+
+def decoded(curve: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(curve), dtype="<f4")
+
+
+def testFloat32EncodingDecodes(client: TestClient) -> None:
+    records = syntheticProfiles(2, seed=3)
+    single = client.post(PREDICT, params={"encoding": "f32"}, json=records[0]).json()
+    batch = client.post(f"{PREDICT}/batch", params={"encoding": "f32"}, json=records).json()
+    expected = scored(records)
+    assert single["encoding"] == batch["encoding"] == "f32"
+    assert np.allclose(decoded(single["hazard"]), expected.hazard[0], rtol=1e-6)
+    assert np.allclose(decoded(single["survival"]), expected.survival[0], rtol=1e-6)
+    for i in range(len(records)):
+        assert np.allclose(decoded(batch["hazard"][i]), expected.hazard[i], rtol=1e-6)
+        assert np.allclose(decoded(batch["survival"][i]), expected.survival[i], rtol=1e-6)
+    assert len(decoded(batch["survival"][0])) == len(classifier.current.times)
+    assert np.allclose(batch["risk"], expected.risk)
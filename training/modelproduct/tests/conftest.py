@@ -0,0 +1,45 @@
+import time
+from pathlib import Path
+from typing import Generator
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app
+from bench import syntheticProfiles
+from config import settings
+from features import compileTransform
+from tests.utils.forest import exportArtifacts
+
+
+@pytest.fixture(scope="session")
+def pipeline():
+    from sklearn.feature_extraction import DictVectorizer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+    data_pipe = Pipeline([('dv', DictVectorizer(sparse=False)),
+                          ('minmax', MinMaxScaler()),
+                          ('std', StandardScaler())])
+    data_pipe.fit(syntheticProfiles(500))
+    return data_pipe
+
+
+@pytest.fixture(scope="session")
+def model_dir(pipeline, tmp_path_factory) -> Path:
+    return exportArtifacts(compileTransform(pipeline), tmp_path_factory.mktemp("model"))
+
+
+@pytest.fixture(scope="session")
+def client(model_dir: Path) -> Generator:
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(settings, "MODEL_DIR", str(model_dir))
+        patch.setattr(settings, "ADMIN_TOKEN", "test-admin-token")
+        patch.setattr(settings, "INFERENCE_WORKERS", 2)
+        with TestClient(app) as c:
+            # the model is loaded and warmed in the background after startup
+            deadline = time.monotonic() + 30
+            while c.get("/v1/finlytik/health/ready").status_code != 200:
+                assert time.monotonic() < deadline, "model service did not become ready"
+                time.sleep(0.05)
+            yield c
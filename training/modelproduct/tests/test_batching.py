@@ -0,0 +1,70 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import batching
+from batching import MicroBatcher
+from classifier import Prediction
+
+
+class FakeModel:
+    """Scores a row as its own value and fails while failing is set"""
+
+    def __init__(self):
+        self.batches = []
+        self.failing = False
+
+    async def predictRows(self, rows):
+        self.batches.append(list(rows))
+        if self.failing:
+            raise RuntimeError("model failed")
+        values = np.asarray(rows, dtype=np.float64)[:, None]
+        return Prediction(values, values, values.ravel(), "v1")
+
+
+@pytest.fixture
+def model(monkeypatch) -> FakeModel:
+    model = FakeModel()
+    monkeypatch.setattr(batching.executor, "predictRows", model.predictRows)
+    return model
+
+
+def run(batcher: MicroBatcher, scenario):
+    async def main():
+        batcher.start()
+        try:
+            return await scenario()
+        finally:
+            await batcher.stop()
+    return asyncio.run(main())
+
+
+def testRequestsAreCoalescedUpToMaxSize(model: FakeModel) -> None:
+    batcher = MicroBatcher(max_size=4, max_wait_ms=50)
+    results = run(batcher, lambda: asyncio.gather(*[batcher.submit(i) for i in range(6)]))
+    assert [len(batch) for batch in model.batches] == [4, 2]
+    assert [result.hazard.shape for result in results] == [(1, 1)] * 6
+    assert [float(result.risk[0]) for result in results] == list(range(6))
+
+
+def testPartialBatchIsScoredAfterMaxWait(model: FakeModel) -> None:
+    batcher = MicroBatcher(max_size=64, max_wait_ms=5)
+    result = run(batcher, lambda: asyncio.wait_for(batcher.submit(7), 1))
+    assert model.batches == [[7]]
+    assert result.version == "v1"
+
+
+def testErrorReachesEveryRequestOfTheBatch(model: FakeModel) -> None:
+    batcher = MicroBatcher(max_size=3, max_wait_ms=50)
+
+    async def scenario():
+        model.failing = True
+        failed = await asyncio.gather(*[batcher.submit(i) for i in range(3)],
+                                      return_exceptions=True)
+        model.failing = False
+        return failed, await batcher.submit(3)
+
+    failed, result = run(batcher, scenario)
+    assert all(isinstance(err, RuntimeError) for err in failed)
+    assert float(result.risk[0]) == 3.
@@ -0,0 +1,47 @@
+import numpy as np
+
+import cache as cache_module
+from cache import PredictionCache
+from classifier import Prediction
+
+
+def testLeastRecentlyUsedIsEvicted() -> None:
+    cache = PredictionCache(max_size=2, ttl_seconds=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["size"] == 2
+
+
+def testExpiredEntryIsAMiss(monkeypatch) -> None:
+    now = [100.]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = PredictionCache(max_size=2, ttl_seconds=10)
+    cache.put("a", 1)
+    now[0] += 5
+    assert cache.get("a") == 1
+    now[0] += 6
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def testKeyDependsOnModelVersion() -> None:
+    class Details:
+        __fields__ = {"age": None, "credit_mix": None}
+        age = 30.
+        credit_mix = "Good"
+
+    assert PredictionCache.key("v1", Details()) == PredictionCache.key("v1", Details())
+    assert PredictionCache.key("v1", Details()) != PredictionCache.key("v2", Details())
+
+
+def testCachedRowDoesNotKeepBatchAlive() -> None:
+    batch = Prediction(np.ones((512, 400)), np.ones((512, 400)), np.ones(512), "v1")
+    row = batch.row(3)
+    assert row.hazard.shape == (1, 400)
+    assert row.hazard.base is None and row.survival.base is None and row.risk.base is None
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+import pytest
+
+import classifier
+from config import settings
+
+
+@pytest.fixture
+def curves(monkeypatch):
+    def reduce(dtype: str = "", max_horizon: float = 0.) -> None:
+        monkeypatch.setattr(settings, "CURVE_DTYPE", dtype)
+        monkeypatch.setattr(settings, "CURVE_MAX_HORIZON", max_horizon)
+    return reduce
+
+
+def testReducedCurvesGetTheirOwnVersion(curves, model_dir: Path) -> None:
+    full = classifier.loadArtifacts(str(model_dir))
+    curves(max_horizon=5.)
+    cut = classifier.loadArtifacts(str(model_dir))
+    curves(dtype="float32", max_horizon=5.)
+    compact = classifier.loadArtifacts(str(model_dir))
+    assert len(full.times) == 12 and len(cut.times) == len(compact.times) == 5
+    assert len({full.version, cut.version, compact.version}) == 3
+    assert cut.version.startswith(full.version)
+
+
+def testUnchangedCurvesKeepTheArtifactVersion(curves, model_dir: Path) -> None:
+    full = classifier.loadArtifacts(str(model_dir))
+    curves(dtype="float64", max_horizon=100.)
+    loaded = classifier.loadArtifacts(str(model_dir))
+    assert loaded.version == full.version
+    assert loaded.forest is not None and loaded.times == full.times
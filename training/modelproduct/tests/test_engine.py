@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from engine import CompiledForest, compileForest, matchesModel, probeRows
+from tests.utils.forest import ToyForest
+
+N_FEATURES = 5
+
+
+@pytest.fixture(scope="module")
+def model() -> ToyForest:
+    return ToyForest()
+
+
+def testCompiledForestMatchesTreeWalk(model: ToyForest) -> None:
+    forest = compileForest(model, N_FEATURES)
+    X = probeRows(N_FEATURES, rows=64)
+    hazard, survival, risk = forest.predict(X)
+    assert np.allclose(hazard, model.predict_hazard(X))
+    assert np.allclose(survival, model.predict_survival(X))
+    assert np.allclose(risk, model.predict_risk(X))
+    assert matchesModel(forest, model, X)
+
+
+def testChunkedPredictMatchesWholeBatch(model: ToyForest) -> None:
+    forest = compileForest(model, N_FEATURES)
+    X = probeRows(N_FEATURES, rows=33)
+    for whole, chunked in zip(forest.predict(X), forest.predict(X, chunk_size=1)):
+        assert np.allclose(whole, chunked)
+
+
+def testMatchesModelRejectsDifferentForest(model: ToyForest) -> None:
+    forest = compileForest(ToyForest(seed=1), N_FEATURES)
+    assert not matchesModel(forest, model, probeRows(N_FEATURES, rows=64))
+
+
+def testSavedForestLoadsMemoryMapped(model: ToyForest, tmp_path) -> None:
+    forest = compileForest(model, N_FEATURES)
+    forest.save(tmp_path / "forest")
+    loaded = CompiledForest.load(tmp_path / "forest", mmap_mode="r")
+    assert isinstance(loaded.leaf_chf, np.memmap)
+    X = probeRows(N_FEATURES)
+    for expected, actual in zip(forest.predict(X), loaded.predict(X)):
+        assert np.array_equal(expected, actual)
+
+
+def testReduceKeepsRisk(model: ToyForest) -> None:
+    forest = compileForest(model, N_FEATURES)
+    reduced = forest.reduce(dtype="float32", max_horizon=6.)
+    X = probeRows(N_FEATURES)
+    hazard, survival, risk = reduced.predict(X)
+    assert reduced.times.tolist() == [1., 2., 3., 4., 5., 6.]
+    assert hazard.dtype == survival.dtype == np.float32
+    assert np.allclose(survival, model.predict_survival(X)[:, :6], rtol=1e-5)
+    assert np.allclose(risk, model.predict_risk(X))
+
+
+def testFittedPysurvivalForest() -> None:
+    survival_forest = pytest.importorskip("pysurvival.models.survival_forest")
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, N_FEATURES))
+    T = rng.integers(1, 30, len(X))
+    E = (rng.random(len(X)) < 0.3).astype(int)
+    model = survival_forest.RandomSurvivalForestModel(num_trees=10)
+    model.fit(X, T, E, max_features="sqrt", min_node_size=10, seed=0)
+    assert matchesModel(compileForest(model, N_FEATURES), model, X[:50])
+
+
+def testReduceRejectsUnservableDtype(model: ToyForest) -> None:
+    with pytest.raises(ValueError):
+        compileForest(model, N_FEATURES).reduce(dtype="float16")
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import classifier
+import executor
+from bench import syntheticProfiles
+from config import settings
+from predict import Details
+
+
+@pytest.fixture
+def loaded(model_dir: Path, monkeypatch) -> classifier.LoadedModel:
+    monkeypatch.setattr(classifier, "current", classifier.loadArtifacts(str(model_dir)))
+    # the pool of a running test client is put back once the test is done
+    monkeypatch.setattr(executor, "executor", None)
+    monkeypatch.setattr(settings, "INFERENCE_WORKERS", 2)
+    yield classifier.current
+    executor.shutdown()
+
+
+def rows(n: int = 3) -> list:
+    return [Details(**record) for record in syntheticProfiles(n, seed=5)]
+
+
+@pytest.mark.parametrize("kind", ["thread", "process", "inline"])
+def testEveryExecutorMatchesModel(kind: str, loaded, model_dir: Path, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "INFERENCE_EXECUTOR", kind)
+    executor.start(str(model_dir))
+    prediction = asyncio.run(executor.predictRows(rows()))
+    expected = loaded.predictRows(rows())
+    assert prediction.version == expected.version
+    assert np.allclose(prediction.hazard, expected.hazard)
+    assert np.allclose(prediction.survival, expected.survival)
+    assert np.allclose(prediction.risk, expected.risk)
+
+
+@pytest.mark.parametrize("kind, thread", [("thread", "inference"), ("inline", "MainThread")])
+def testInferenceThread(kind: str, thread: str, loaded, monkeypatch) -> None:
+    names = []
+
+    def predictRows(rows):
+        names.append(threading.current_thread().name)
+        return loaded.predictRows(rows)
+
+    monkeypatch.setattr(classifier, "predictRows", predictRows)
+    monkeypatch.setattr(settings, "INFERENCE_EXECUTOR", kind)
+    executor.start()
+    asyncio.run(executor.predictRows(rows()))
+    assert names[0].startswith(thread)
+
+
+def testUnknownExecutor(loaded, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "INFERENCE_EXECUTOR", "gpu")
+    with pytest.raises(ValueError):
+        executor.start()
@@ -0,0 +1,30 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from bench import syntheticProfiles
+from features import FeatureTransform, compileTransform
+
+
+def testCompiledTransformMatchesPipeline(pipeline) -> None:
+    records = syntheticProfiles(64, seed=7)
+    transform = compileTransform(pipeline)
+    compiled = transform.transform([SimpleNamespace(**record) for record in records])
+    assert np.allclose(compiled, pipeline.transform(records))
+
+
+def testUnknownCategoryIsDropped(pipeline) -> None:
+    record = syntheticProfiles(1, seed=7)[0]
+    record["credit_mix"] = "Unknown"
+    transform = compileTransform(pipeline)
+    compiled = transform.transform([SimpleNamespace(**record)])
+    assert np.allclose(compiled, pipeline.transform([record]))
+
+
+def testSavedTransformLoads(pipeline, tmp_path) -> None:
+    transform = compileTransform(pipeline)
+    transform.save(tmp_path / "transform.npz")
+    loaded = FeatureTransform.load(tmp_path / "transform.npz")
+    rows = [SimpleNamespace(**record) for record in syntheticProfiles(8, seed=7)]
+    assert loaded.columns == transform.columns
+    assert np.array_equal(loaded.transform(rows), transform.transform(rows))
@@ -0,0 +1,78 @@
+from pathlib import Path
+
+import numpy as np
+
+from engine import compileForest
+
+
+class ToyForest:
+    """
+    Random trees in the layout pysurvival keeps on a fitted forest, with its predict
+    calls written as a plain walk of every tree for every row
+    """
+
+    def __init__(self, n_features: int = 5, num_trees: int = 7, max_depth: int = 4,
+                 seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.times = np.arange(1., 13.)
+        # ranger ids: time first, status third, the features are the others
+        self.variable_names = (["time", "f0", "event"]
+                               + [f"f{i}" for i in range(1, n_features)])
+        self.dependent_varID, self.status_varID = 0, 2
+        self.features = [1] + list(range(3, n_features + 2))
+        self.num_trees = num_trees
+        self.child_nodeIDs, self.split_varIDs, self.split_values, self.chf = [], [], [], []
+        for _ in range(num_trees):
+            left, right, var, value, chf = [0], [0], [0], [0.], [None]
+            grow = [(0, 0)]
+            while grow:
+                node, depth = grow.pop()
+                if depth == max_depth or (depth and rng.random() < 0.3):
+                    chf[node] = np.cumsum(rng.uniform(0, 0.05, len(self.times)))
+                    continue
+                var[node] = int(rng.choice(self.features))
+                value[node] = float(rng.normal())
+                for side in (left, right):
+                    side[node] = len(left)
+                    grow.append((len(left), depth + 1))
+                    for array, blank in ((left, 0), (right, 0), (var, 0), (value, 0.),
+                                         (chf, None)):
+                        array.append(blank)
+            self.child_nodeIDs.append((left, right))
+            self.split_varIDs.append(var)
+            self.split_values.append(value)
+            self.chf.append([c if c is not None else [] for c in chf])
+
+    def column(self, var_id: int) -> int:
+        return self.features.index(var_id)
+
+    def leafCurves(self, x):
+        for tree in range(self.num_trees):
+            left, right = self.child_nodeIDs[tree]
+            node = 0
+            while left[node] or right[node]:
+                column = self.column(self.split_varIDs[tree][node])
+                node = left[node] if x[column] <= self.split_values[tree][node] else right[node]
+            yield np.asarray(self.chf[tree][node])
+
+    def cumulativeHazard(self, X):
+        return np.array([np.mean(list(self.leafCurves(x)), axis=0) for x in X])
+
+    def predict_hazard(self, X):
+        return np.diff(self.cumulativeHazard(X), axis=1, prepend=0.)
+
+    def predict_survival(self, X):
+        return np.array([np.mean(np.exp(-np.array(list(self.leafCurves(x)))), axis=0)
+                         for x in X])
+
+    def predict_risk(self, X):
+        return self.cumulativeHazard(X).sum(axis=1)
+
+
+def exportArtifacts(transform, model_dir: Path, seed: int = 0) -> Path:
+    """Writes transform.npz and the compiled forest of a ToyForest as the service loads them"""
+    model_dir.mkdir(parents=True, exist_ok=True)
+    transform.save(model_dir / "transform.npz")
+    model = ToyForest(transform.n_features, seed=seed)
+    compileForest(model, transform.n_features).save(model_dir / "forest")
+    return model_dir